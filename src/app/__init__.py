@@ -4,16 +4,22 @@ from flask import Flask
 from dotenv import load_dotenv
 from flask_cors import CORS
 
+# Load .env before the controllers import, so module-level settings read from os.getenv see it
+load_dotenv()
+
 from controllers.auth_controller import auth_ns
 from infra.db.db_config import init_db
 from infra.swagger import api
 
 from infra.oauth.oauth_config import init_oauth
 from controllers.chat_controller import chat_ns         # remains as before
-
-load_dotenv()
+from helpers.metrics_helper import collect_metrics
+from helpers.vision_helper import start_warmup, vision_status
+from helpers.llm_helper import validate_llm_config
+from helpers.job_helper import start_job_workers
 
 def create_app():
+    validate_llm_config()
     app = Flask(__name__, template_folder="../templates")
     app.url_map.strict_slashes = False
 
@@ -48,9 +54,25 @@ def create_app():
     @app.get('/')
     def home():
         return "Welcome to the Flask API!"
+
+    @app.get('/healthz')
+    def healthz():
+        return jsonify({"status": "ok"})
+
+    @app.get('/readyz')
+    def readyz():
+        status = vision_status()
+        return jsonify(status), 200 if status["ready"] else 503
+
+    @app.get('/metrics')
+    def metrics():
+        return jsonify(collect_metrics())
     
     api.init_app(app)
     api.add_namespace(auth_ns, path='/api/auth')
     api.add_namespace(chat_ns, path='/api/chat')
+
+    start_warmup()
+    start_job_workers()
     
     return app
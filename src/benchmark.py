@@ -0,0 +1,83 @@
+import argparse
+import json
+import random
+import time
+from helpers.analysis_helper import encoding_savings
+from helpers.feature_helper import parse_features
+from helpers.image_helper import load_image_dir
+from helpers.layout_helper import build_layout
+
+def _load_analyses(args):
+    """result_data lists from a saved JSON file, or by running the vision pipeline over screenshots."""
+    if args.analyses:
+        with open(args.analyses) as f:
+            return json.load(f)
+    from helpers.vision_helper import analyze_image
+    features = parse_features(args.features)
+    return [analyze_image(image, features) for image in load_image_dir(args.samples)]
+
+def _synthetic_page(boxes, seed=0):
+    """result_data for a grid of card-like sections of labelled fields, with a few duplicates."""
+    rng = random.Random(seed)
+    names = ['button', 'field', 'label', 'link', 'text']
+    result_data, y = [], 0.0
+    while len(result_data) < boxes:
+        columns = rng.randint(1, 6)
+        for row in range(rng.randint(1, 5)):
+            for column in range(columns):
+                class_id = rng.randrange(len(names))
+                width, height = 1800 / columns - 16, rng.uniform(20, 48)
+                result_data.append({
+                    "class_id": class_id,
+                    "class_name": names[class_id],
+                    "confidence": rng.uniform(0.3, 1.0),
+                    "bbox": {"width": width, "height": height,
+                             "center_x": 8 + column * (width + 16) + width / 2, "center_y": y + row * 56 + height / 2},
+                })
+                if rng.random() < 0.05:
+                    result_data.append(dict(result_data[-1], confidence=rng.uniform(0.3, 1.0)))
+        y += 56 * 5 + 80
+    return result_data[:boxes]
+
+def layout_timings(analyses, repeat=5):
+    """Best-of-repeat build_layout time per analysis, with box counts before and after deduplication."""
+    rows = []
+    for result_data in analyses:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            layout = build_layout(result_data)
+            best = min(best, time.perf_counter() - start)
+        rows.append({"boxes": len(result_data), "kept": len(layout["elements"]), "ms": round(best * 1000, 2)})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the image analysis pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fmt = commands.add_parser("format", help="Prompt size of the compact analysis encoding vs the legacy repr")
+    source = fmt.add_mutually_exclusive_group(required=True)
+    source.add_argument("--samples", help="Directory of screenshots to analyze")
+    source.add_argument("--analyses", help="JSON file holding a list of result_data lists")
+    fmt.add_argument("--features", help="Per-box features to compute for --samples")
+
+    layout = commands.add_parser("layout", help="Time build_layout on synthetic pages or saved analyses")
+    source = layout.add_mutually_exclusive_group()
+    source.add_argument("--samples", help="Directory of screenshots to analyze")
+    source.add_argument("--analyses", help="JSON file holding a list of result_data lists")
+    layout.add_argument("--features", help="Per-box features to compute for --samples")
+    layout.add_argument("--boxes", default="100,500,1000,2000", help="Synthetic page sizes when no source is given")
+    layout.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "format":
+        print(json.dumps(encoding_savings(_load_analyses(args)), indent=2))
+    elif args.command == "layout":
+        if args.samples or args.analyses:
+            analyses = _load_analyses(args)
+        else:
+            analyses = [_synthetic_page(int(n)) for n in args.boxes.split(',')]
+        print(json.dumps(layout_timings(analyses, args.repeat), indent=2))
+
+if __name__ == '__main__':
+    main()
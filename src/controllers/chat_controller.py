@@ -1,160 +1,224 @@
 from flask_restx import Namespace as RestxNamespace, Resource, fields
-from flask import request
-from ultralytics import YOLO
-from infra.db.models import ChatMessage, EditorMessage
-from helpers.auth_helper import token_required
-import cv2, easyocr, re
-from PIL import Image
-from io import BytesIO
-import base64
+from flask import request, Response, stream_with_context
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from infra.db.models import ChatMessage, EditorMessage, User
+from helpers.auth_helper import token_required, verify_token
+import re
 import os
-import uuid
-import requests
+from helpers.image_helper import load_images, read_image_bytes, sniff_format, RASTER_FORMATS
+from helpers.pdf_helper import iter_pdf_pages
+from helpers.feature_helper import parse_features
+from helpers.analysis_helper import estimate_tokens, format_analysis, format_analyses
+from helpers.layout_helper import ANALYSIS_LAYOUT, build_layout
+from helpers.vision_helper import analyze_images, model_version, refresh_features
+from helpers.vision_pool_helper import VisionPoolSaturated
+from helpers.metrics_helper import register_metrics
+from helpers.llm_helper import cache_enabled, generate, generate_stream
+from helpers.job_helper import enqueue_generation
+from helpers.context_helper import build_context
+from helpers.patch_helper import PatchError, generate_patch, incremental_enabled, latest_snapshot, record_fallback
+from helpers.singleflight_helper import single_flight
+from helpers.cache_helper import TieredCache, digest
+from helpers.similarity_helper import SIMILARITY_CACHE, SimilarityIndex, phash
 from middlewares.auth_middleware import credit_required
 from infra.swagger import api
-import google.generativeai as genai
 from infra.db.models import Chat
 import json
-import numpy as np
-from sklearn.cluster import KMeans
 import sys
-# Load the YOLO model
-model_yolo = YOLO('src/controllers/yolov8n_trained.pt')
+from contextlib import closing
+# Analyses keyed by decoded pixels, so re-uploads of the same screenshot skip the pipeline
+analysis_cache = TieredCache(
+    'image_analysis',
+    int(os.getenv('ANALYSIS_CACHE_SIZE', 256)),
+    mongo_enabled=os.getenv('ANALYSIS_CACHE_MONGO', 'false').lower() == 'true',
+    mongo_max_entries=int(os.getenv('ANALYSIS_CACHE_MONGO_MAX_ENTRIES', 10000))
+)
+register_metrics('analysis_cache', analysis_cache.stats)
+# Perceptual hashes of analyzed images, so near-duplicate uploads reuse an earlier analysis
+similar_images = SimilarityIndex(
+    'image_phash',
+    mongo_enabled=os.getenv('ANALYSIS_CACHE_MONGO', 'false').lower() == 'true'
+)
+register_metrics('similarity_cache', similar_images.stats)
+# Limits for /send-batch; the byte limit covers the whole request body as it is read
+IMAGE_BATCH_MAX_IMAGES = int(os.getenv('IMAGE_BATCH_MAX_IMAGES', 8))
+IMAGE_BATCH_MAX_BYTES = int(os.getenv('IMAGE_BATCH_MAX_BYTES', 40 * 1024 * 1024))
 
 # Helper Functions
 
-class_names = ['button', 'field', 'heading', 'iframe', 'image', 'label', 'link', 'text']
-
-def analyze_gradient(image_array, num_colors=5):
-    image_rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-    pixels = image_rgb.reshape((-1, 3))
-    kmeans = KMeans(n_clusters=num_colors, random_state=42)
-    kmeans.fit(pixels)
-    dominant_colors = np.array(kmeans.cluster_centers_, dtype=int)
-    gradient_magnitude = cv2.Laplacian(cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY), cv2.CV_64F)
-    gradient_direction = cv2.phase(gradient_magnitude, gradient_magnitude, angleInDegrees=True)
-    return dominant_colors.tolist(), gradient_direction.tolist()
-
-def process_image(image_data):
-    if hasattr(image_data, 'read'):
-        image = Image.open(image_data)
-    elif isinstance(image_data, str):
-        # Handle both direct URLs and data URLs
-        if image_data.startswith("http"):
-            response = requests.get(image_data)
-            if response.status_code != 200:
-                raise Exception("Failed to retrieve image from URL")
-            image = Image.open(BytesIO(response.content))
-        else:
-            # For data URLs, split the actual base64 content
-            parts = image_data.split('base64,')
-            if len(parts) == 2:
-                image_str = parts[1]
+def process_image(image_data, features=None, pages=None):
+    return process_images([image_data], features, pages)[0]
+
+def _cached_analysis(img, features):
+    """
+    Look img up by exact pixels, then among near-duplicates of the same size. A near-duplicate
+    only lends its detections: features are recomputed on img, so another upload's text or colors
+    are never returned. Returns (keys, result_data or None); pass keys to _cache_analysis after a miss.
+    """
+    version = model_version()
+    cache_key = digest(version, ','.join(features), str(img.shape), img)
+    result_data = analysis_cache.get(cache_key)
+    if not SIMILARITY_CACHE:
+        return (cache_key, None, None), result_data
+    bucket = digest(version, ','.join(features), str(img.shape))
+    image_hash = phash(img)
+    if result_data is None:
+        similar_key = similar_images.find(bucket, image_hash)
+        similar = analysis_cache.get(similar_key) if similar_key is not None else None
+        if similar is not None:
+            result_data = refresh_features(img, similar, features)
+            _cache_analysis((cache_key, bucket, image_hash), result_data)
+    return (cache_key, bucket, image_hash), result_data
+
+def _cache_analysis(keys, result_data):
+    cache_key, bucket, image_hash = keys
+    analysis_cache.set(cache_key, result_data)
+    if bucket is not None:
+        similar_images.add(bucket, image_hash, cache_key)
+
+def _present(result_data):
+    # Detections are grouped into a section/row/column tree for the prompt
+    return build_layout(result_data) if ANALYSIS_LAYOUT else result_data
+
+def process_images(images, features=None, pages=None):
+    """
+    Analyze several images together: decoded concurrently, cache misses detected as one batch.
+    PDFs are analyzed page by page (pages is a range such as "1-3,5"). Returns one analysis
+    per image, in order.
+    """
+    features = parse_features(features)
+    loaded = load_images(images)
+    results = [None] * len(loaded)
+    misses = []
+    for index, (img, mime_type, buf) in enumerate(loaded):
+        if mime_type in RASTER_FORMATS:
+            keys, result_data = _cached_analysis(img, features)
+            if result_data is None:
+                misses.append((index, keys))
             else:
-                image_str = image_data
-            image = Image.open(BytesIO(base64.b64decode(image_str)))
-    else:
-        raise Exception("Unsupported image input type")
-
-    if image.mode != "RGB":
-        image = image.convert("RGB")
-
-    temp_path = f"temp_{uuid.uuid4()}.jpg"
-    image.save(temp_path)
-    mime_type = image.format.lower() if image.format else 'jpg'
-    if mime_type in ['png', 'jpeg', 'jpg']:
-        img = cv2.imread(temp_path)
-        results = model_yolo(img)
-        result_data = []
-        for result in results:
-            for box in result.boxes:
-                cls_id = int(box.cls[0])
-                class_name = class_names[cls_id]
-                x_min, y_min, x_max, y_max = box.xyxy[0].tolist()
-                width = x_max - x_min
-                height = y_max - y_min
-                center_x = x_min + width / 2
-                center_y = y_min + height / 2
-                cropped_image = img[int(y_min):int(y_max), int(x_min):int(x_max)]
-                dominant_colors, gradient_direction = analyze_gradient(cropped_image)
-                result_data.append({
-                    "class_id": cls_id,
-                    "class_name": class_name,
-                    "confidence": float(box.conf[0]),
-                    "bbox": {
-                        "width": width,
-                        "height": height,
-                        "center_x": center_x,
-                        "center_y": center_y
-                    },
-                    "color_distribution": dominant_colors
-                })
-        print(result_data)
-        analysis = result_data
-    elif mime_type == 'pdf':
-        analysis = "PDF content analysis not implemented"
+                results[index] = _present(result_data)
+        elif mime_type == 'pdf':
+            results[index] = {"pages": [
+                {"page": number, "analysis": analysis}
+                for number, analysis in iter_document_analysis(buf, features, pages)
+            ]}
+        else:
+            raise Exception("Unsupported file type")
+    if misses:
+        for (index, keys), result_data in zip(misses, analyze_images([loaded[i][0] for i, _ in misses], features)):
+            _cache_analysis(keys, result_data)
+            results[index] = _present(result_data)
+    return results
+
+def iter_document_analysis(buf, features=None, pages=None):
+    """
+    Yield (page_number, analysis) for the selected pages of a PDF as each one is finished.
+    Pages are rasterized lazily, so memory stays bounded by the page being analyzed.
+    """
+    features = parse_features(features)
+    for number, img in iter_pdf_pages(buf, pages):
+        keys, result_data = _cached_analysis(img, features)
+        if result_data is None:
+            result_data = analyze_images([img], features)[0]
+            _cache_analysis(keys, result_data)
+        del img
+        yield number, _present(result_data)
+
+def element_count(analysis):
+    """Number of detected UI elements in a process_images result (summed over PDF pages)."""
+    if isinstance(analysis, dict) and 'pages' in analysis:
+        return sum(element_count(page['analysis']) for page in analysis['pages'])
+    if isinstance(analysis, dict):
+        return len(analysis['elements'])
+    return len(analysis) if isinstance(analysis, list) else 0
+
+def prompt_sender():
+    """
+    The user sending a prompt, from the token cookie; anonymous visitors get a single prompt.
+    Returns (user, None), or (None, (body, status)) when the prompt may not be sent.
+    """
+    user = verify_token(request.cookies.get('token'))
+    if not user:
+        if getattr(ChatSend, 'anonymous_used', False):
+            return None, ({"error": "Please login to continue chatting"}, 401)
+        ChatSend.anonymous_used = True
+    elif user.freeCredits <= 0:
+        return None, ({"error": "You have no more credits left"}, 403)
+    return user, None
+
+def charge_credit(user):
+    """Take the credit for a prompt from a logged-in sender."""
+    if user:
+        user.update(dec__freeCredits=1)
+
+def wants_stream(data):
+    """Stream the reply as server-sent events when the body sets stream or the client accepts SSE."""
+    return str(data.get('stream', '')).lower() in ('true', '1') or \
+        'text/event-stream' in request.headers.get('Accept', '')
+
+def wants_async(data):
+    """Queue the reply as a background job when the body sets async or sends Prefer: respond-async."""
+    return str(data.get('async', '')).lower() in ('true', '1') or \
+        'respond-async' in request.headers.get('Prefer', '')
+
+def queue_reply(chat, message, kind, full_prompt, cache=False):
+    """Save message on chat as pending, queue its generation and return the 202 response."""
+    message.status = 'pending'
+    message.save()
+    if isinstance(message, EditorMessage):
+        chat.update(push__editor_messages=message)
     else:
-        analysis = "Unsupported file type"
-    os.remove(temp_path)
-    return analysis
-
-def generate_text_response(prompt):
-    api_key = os.getenv('GOOGLE_API_KEY')
-    genai.configure(api_key=api_key)
-    generation_config = {
-    "temperature": 1,
-    "top_p": 0.95,
-    "top_k": 40,
-    "max_output_tokens": 8192,
-    "response_mime_type": "text/plain",
-    }
-
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-pro",
-        generation_config=generation_config,
-    )
-
-    chat_session = model.start_chat(history=[])
-    
-    response = chat_session.send_message(prompt)
-    
-    if not api_key:
-        raise Exception("Missing GOOGLE_API_KEY environment variable")
-    
-    return response.text
-
-def generate_code_response(prompt):
-    api_key = os.getenv('GOOGLE_API_KEY')
-    genai.configure(api_key=api_key)
-
-    generation_config = {
-    "temperature": 1,
-    "top_p": 0.95,
-    "top_k": 40,
-    "max_output_tokens": 8192,
-    "response_mime_type": "application/json",
-    }
-
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash",
-        generation_config=generation_config,
-    )
-
-    chat_session = model.start_chat(history=[])
-    
-    response = chat_session.send_message(prompt)
-    
-
-    if not api_key:
-        raise Exception("Missing GOOGLE_API_KEY environment variable")
-    
-    return response.text
+        chat.update(push__chat_messages=message)
+    enqueue_generation(message, kind, full_prompt, cache)
+    return {
+        "chat_id": str(chat.id),
+        "message_id": str(message.id),
+        "status": "pending",
+    }, 202
+
+def flight_key(route, chat_id, data, image_file=None):
+    """Single-flight key for a chat request: route, chat, prompt, options and uploaded image content."""
+    image = b''
+    if image_file:
+        image = image_file.read()
+        image_file.seek(0)
+    options = json.dumps({k: data.get(k) for k in ('features', 'pages', 'async', 'incremental')}, sort_keys=True)
+    return digest(route, chat_id, data.get('prompt', ''), options, digest(image))
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def stream_reply(full_prompt, kind, persist, cache=False):
+    """
+    SSE response relaying generate_stream output as "chunk" events. Once the model finishes, the
+    full text is passed to persist and its result sent as a final "done" event. A client
+    disconnect closes the stream, cancelling the generation without saving anything.
+    """
+    def events():
+        parts = []
+        try:
+            with closing(generate_stream(full_prompt, kind, cache)) as chunks:
+                for text in chunks:
+                    parts.append(text)
+                    yield _sse("chunk", {"text": text})
+            yield _sse("done", persist(''.join(parts)))
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Define REST namespace for chat endpoints
 chat_ns = RestxNamespace('chat', description='HTTP-based chat endpoints')
 chat_model = api.model('ChatMessage', {
     'prompt': fields.String(required=True, description="Prompt message"),
     'image': fields.String(description="Base64 encoded image (optional)"),
+    'features': fields.String(description="Comma separated per-box image features, e.g. colors,gradient,edge_density (optional)"),
+    'pages': fields.String(description="PDF pages to analyze, e.g. 1-3,5 (optional)"),
+    'stream': fields.Boolean(description="Stream the reply as server-sent events (optional)"),
+    'async': fields.Boolean(description="Queue the reply and return 202 with a message id to poll (optional)"),
+    'incremental': fields.Boolean(description="/send-code only: patch the latest code instead of regenerating it (optional)"),
     'chat_id': fields.String(required=True, description="Existing chat id")
 })
 
@@ -162,13 +226,29 @@ chat_model = api.model('ChatMessage', {
 chat_create_model = api.model('ChatCreate', {
     'title': fields.String(required=True, description="Chat title"),
     'prompt': fields.String(required=True, description="Initial chat prompt"),
-    'image': fields.String(description="Base64 encoded image (optional)")
+    'image': fields.String(description="Base64 encoded image (optional)"),
+    'features': fields.String(description="Comma separated per-box image features, e.g. colors,gradient,edge_density (optional)"),
+    'pages': fields.String(description="PDF pages to analyze, e.g. 1-3,5 (optional)"),
+    'async': fields.Boolean(description="Queue the reply and return 202 with a message id to poll (optional)")
 })
 
 chat_update_model = api.model('ChatUpdate', {
     'title': fields.String(required=True, description="Chat title")
 })
 
+# Multipart form for /send-batch; repeat the "images" field once per screenshot
+chat_batch_parser = chat_ns.parser()
+chat_batch_parser.add_argument('prompt', location='form', required=True, help="Prompt message")
+chat_batch_parser.add_argument('chat_id', location='form', required=True, help="Existing chat id")
+chat_batch_parser.add_argument('features', location='form', help="Comma separated per-box image features (optional)")
+chat_batch_parser.add_argument('pages', location='form', help="PDF pages to analyze, e.g. 1-3,5 (optional)")
+chat_batch_parser.add_argument('images', location='files', type=FileStorage, action='append', required=True, help="Screenshots to analyze together")
+
+document_parser = chat_ns.parser()
+document_parser.add_argument('document', location='files', type=FileStorage, required=True, help="PDF to analyze")
+document_parser.add_argument('features', location='form', help="Comma separated per-box image features (optional)")
+document_parser.add_argument('pages', location='form', help="Pages to analyze, e.g. 1-3,5 (optional)")
+
 feedback_model = api.model('Feedback', {
     'feedback': fields.String(required=True, description="User feedback text")
 })
@@ -215,41 +295,50 @@ class ChatSend(Resource):
         chat_id = data.get('chat_id')
         if not chat_id:
             return {"error": "Chat id is required"}, 400
-        token = request.cookies.get('token')
-        from helpers.auth_helper import verify_token
-        user = verify_token(token)
-        if not user:
-            if hasattr(ChatSend, 'anonymous_used') and ChatSend.anonymous_used:
-                return {"error": "Please login to continue chatting"}, 401
-            ChatSend.anonymous_used = True
-        else:
-            if user.freeCredits <= 0:
-                return {"error": "You have no more credits left"}, 403
-            user.update(dec__freeCredits=1)
+        user, error = prompt_sender()
+        if error:
+            return error
         # Process image from request.files if provided
         image_file = request.files.get('image')
+        if wants_stream(data):
+            return self.reply(data, chat_id, prompt, image_file, user)
+        # Duplicate submissions (double clicks, retries) share one generation and one message
+        body, status = single_flight(flight_key('send', chat_id, data, image_file),
+                                     lambda: self.reply(data, chat_id, prompt, image_file, user))
+        return body, status
+
+    def reply(self, data, chat_id, prompt, image_file, user=None):
+        charge_credit(user)
         
         #image_file
         
         if image_file:
             try:
-                analysis = process_image(image_file)
+                analysis = process_image(image_file, data.get('features'), data.get('pages'))
+            except VisionPoolSaturated as e:
+                return {"error": str(e)}, 503
             except Exception as e:
                 return {"error": f"Image processing failed: {str(e)}"}, 400
-            prompt += f"\n[Image analysis: {analysis}]"
+            prompt += f"\n[Image analysis: {format_analysis(analysis)}]"
         chat = Chat.objects(id=chat_id).first()
         if not chat:
             return {"error": "Chat not found"}, 404
-        # Build conversation history context from existing messages
-        history = ""
-        # Sort messages ascending by creation time
-        # for msg in sorted(chat.chat_messages, key=lambda m: m.created_at):
-        #     history += f"User: {msg.prompt}\nBot: {msg.response}\n"
-
+        # Conversation history: rolling summary of older turns plus the recent ones, within budget
+        history = build_context(chat, 'chat')
         # Append the new user prompt
         full_prompt = history + f"User: {prompt}\nBot:"
+
+        if wants_async(data):
+            return queue_reply(chat, ChatMessage(prompt=prompt), 'text', full_prompt, cache_enabled('send'))
+        if wants_stream(data):
+            def persist(text):
+                new_msg = ChatMessage(prompt=prompt, response=text)
+                new_msg.save()
+                chat.update(push__chat_messages=new_msg)
+                return {"chat_id": str(chat.id), "message_id": str(new_msg.id)}
+            return stream_reply(full_prompt, 'text', persist, cache_enabled('send'))
         
-        ai_response = generate_text_response(full_prompt)   #############################-------<<<<<<<
+        ai_response = generate(full_prompt, 'text', cache=cache_enabled('send'))   #############################-------<<<<<<<
 
         # Save the new message
         new_msg = ChatMessage(prompt=prompt, response=ai_response)
@@ -286,38 +375,61 @@ class ChatSend(Resource):
         chat_id = data.get('chat_id')
         if not chat_id:
             return {"error": "Chat id is required"}, 400
-        token = request.cookies.get('token')
-        from helpers.auth_helper import verify_token
-        user = verify_token(token)
-        if not user:
-            if hasattr(ChatSend, 'anonymous_used') and ChatSend.anonymous_used:
-                return {"error": "Please login to continue chatting"}, 401
-            ChatSend.anonymous_used = True
-        else:
-            if user.freeCredits <= 0:
-                return {"error": "You have no more credits left"}, 403
-            user.update(dec__freeCredits=1)
+        user, error = prompt_sender()
+        if error:
+            return error
         # Process image from request.files if provided
         image_file = request.files.get('image')
+        if wants_stream(data):
+            return self.reply(data, chat_id, prompt, image_file, user)
+        # Duplicate submissions (double clicks, retries) share one generation and one EditorMessage
+        body, status = single_flight(flight_key('send-code', chat_id, data, image_file),
+                                     lambda: self.reply(data, chat_id, prompt, image_file, user))
+        return body, status
+
+    def reply(self, data, chat_id, prompt, image_file, user=None):
+        charge_credit(user)
         if image_file:
             try:
-                analysis = process_image(image_file)
+                analysis = process_image(image_file, data.get('features'), data.get('pages'))
+            except VisionPoolSaturated as e:
+                return {"error": str(e)}, 503
             except Exception as e:
                 return {"error": f"Image processing failed: {str(e)}"}, 400
-            prompt += f"\n[Image analysis: {analysis}]"
+            prompt += f"\n[Image analysis: {format_analysis(analysis)}]"
         chat = Chat.objects(id=chat_id).first()
         if not chat:
             return {"error": "Chat not found"}, 404
-        # Build conversation history context from existing messages
-        history = ""
-        # Sort messages ascending by creation time
-        # for msg in sorted(chat.chat_messages, key=lambda m: m.created_at):
-        #     history += f"User: {msg.prompt}\nBot: {msg.response}\n"
+        # Conversation history: rolling summary of older code turns plus the recent ones, within budget
+        history = build_context(chat, 'editor')
         # Append the new user prompt
         full_prompt = history + f"User: {prompt}\nBot: "
-        ai_response = generate_code_response(full_prompt)
+        if wants_async(data):
+            return queue_reply(chat, EditorMessage(prompt=prompt), 'code', full_prompt, cache_enabled('send-code'))
+        if wants_stream(data):
+            def persist(text):
+                new_msg = EditorMessage(prompt=prompt, response=text)
+                new_msg.save()
+                chat.update(push__editor_messages=new_msg)
+                return {"chat_id": str(chat.id), "message_id": str(new_msg.id)}
+            return stream_reply(full_prompt, 'code', persist, cache_enabled('send-code'))
+        # Incremental mode: patch the latest files; fall back to regenerating the whole project
+        base_msg, patch, saved_tokens = None, None, 0
+        if incremental_enabled(data):
+            base_msg, files = latest_snapshot(chat)
+        if base_msg is not None:
+            try:
+                patch, files = generate_patch(files, full_prompt, cache_enabled('send-code'))
+                ai_response = json.dumps(files)
+                saved_tokens = estimate_tokens(ai_response) - estimate_tokens(patch)
+            except PatchError as e:
+                print(f"Patch failed, regenerating the whole project: {e}", flush=True)
+                record_fallback()
+                base_msg = patch = None
+        if patch is None:
+            ai_response = generate(full_prompt, 'code', cache=cache_enabled('send-code'))
         # Create a new message with code response stored in the code attribute
-        new_msg = EditorMessage(prompt=prompt, response=ai_response)
+        new_msg = EditorMessage(prompt=prompt, response=ai_response, patch=patch, base_message=base_msg)
         new_msg.save()
         chat.update(push__editor_messages=new_msg)
         
@@ -331,6 +443,8 @@ class ChatSend(Resource):
             "chat_id": str(chat.id),
             "message_id": str(new_msg.id),
             "response": ai_response,
+            "mode": "patch" if patch is not None else "full",
+            "saved_output_tokens": saved_tokens,
             "new_message": {
                 "id": str(new_msg.id),
                 "prompt": new_msg.prompt,
@@ -338,25 +452,100 @@ class ChatSend(Resource):
             }
         }, 200
 
+@chat_ns.route('/send-batch')
+class ChatSendBatch(Resource):
+    @chat_ns.expect(chat_batch_parser)
+    def post(self):
+        """
+        Send a prompt with several screenshots (e.g. landing, pricing, dashboard) to an existing chat.
+        The images are analyzed together and their analyses attached to one chat message.
+        """
+        # Applied to the bytes read as well as Content-Length, so chunked uploads are capped too
+        request.max_content_length = IMAGE_BATCH_MAX_BYTES
+        try:
+            image_files = [f for f in request.files.getlist('images') if f]
+        except RequestEntityTooLarge:
+            return {"error": f"Images exceed the {IMAGE_BATCH_MAX_BYTES} byte limit"}, 413
+        if not image_files:
+            return {"error": "At least one image is required"}, 400
+        if len(image_files) > IMAGE_BATCH_MAX_IMAGES:
+            return {"error": f"At most {IMAGE_BATCH_MAX_IMAGES} images can be sent at once"}, 413
+        data = request.form.to_dict()
+        prompt = data.get('prompt', '')
+        chat_id = data.get('chat_id')
+        if not chat_id:
+            return {"error": "Chat id is required"}, 400
+        user, error = prompt_sender()
+        if error:
+            return error
+        charge_credit(user)
+        try:
+            analyses = process_images(image_files, data.get('features'), data.get('pages'))
+        except VisionPoolSaturated as e:
+            return {"error": str(e)}, 503
+        except Exception as e:
+            return {"error": f"Image processing failed: {str(e)}"}, 400
+        names = [f.filename or f"image{i}" for i, f in enumerate(image_files, 1)]
+        prompt += f"\n[Image analysis: {format_analyses(zip(names, analyses))}]"
+        chat = Chat.objects(id=chat_id).first()
+        if not chat:
+            return {"error": "Chat not found"}, 404
+        full_prompt = f"User: {prompt}\nBot:"
+        if wants_async(data):
+            return queue_reply(chat, ChatMessage(prompt=prompt), 'text', full_prompt, cache_enabled('send-batch'))
+        ai_response = generate(full_prompt, 'text', cache=cache_enabled('send-batch'))
+        new_msg = ChatMessage(prompt=prompt, response=ai_response)
+        new_msg.save()
+        chat.update(push__chat_messages=new_msg)
+        return {
+            "chat_id": str(chat.id),
+            "message_id": str(new_msg.id),
+            "response": ai_response,
+            "images": [{"name": name, "elements": element_count(a)} for name, a in zip(names, analyses)],
+        }, 200
+
+@chat_ns.route('/analyze-document')
+class DocumentAnalysis(Resource):
+    @chat_ns.expect(document_parser)
+    @token_required
+    def post(self, user):
+        """
+        Analyze a multi-page PDF page by page, streaming one JSON line per page (application/x-ndjson)
+        as soon as it is done.
+        """
+        document = request.files.get('document')
+        if not document:
+            return {"error": "A PDF document is required"}, 400
+        buf = read_image_bytes(document)
+        if sniff_format(buf) != 'pdf':
+            return {"error": "Document is not a PDF"}, 400
+        data = request.form.to_dict()
+
+        def stream():
+            try:
+                for number, analysis in iter_document_analysis(buf, data.get('features'), data.get('pages')):
+                    yield json.dumps({
+                        "page": number,
+                        "elements": element_count(analysis),
+                        "analysis": format_analysis(analysis),
+                    }) + "\n"
+            except VisionPoolSaturated as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": f"Document processing failed: {str(e)}"}) + "\n"
+
+        return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
 def generate_and_update_message(chat_id, message_id, prompt):
+    """Queue a job that fills in the EditorMessage's response; returns the job, or None if not found."""
     # Re-fetch chat and message from DB
     chat = Chat.objects(id=chat_id).first()
     message = EditorMessage.objects(id=message_id).first()
     if not chat or not message:
-        return
+        return None
     # Build full prompt (here, no history because it's the first message)
     full_prompt = f"User: {prompt}\nBot: "
-    ai_response = generate_text_response(full_prompt)
-    print("update the message docccccccccccccccccc", flush =True)
-    sys.stdout.flush()
-    print(f'\n\n\n{ai_response}\n\n', flush=True)
-    sys.stdout.flush()
-
-
-    
-    # Update the message document with AI response and code
-    message.response = ai_response
-    message.save()
+    return enqueue_generation(message, 'text', full_prompt)
 
 @chat_ns.route('/create')
 class ChatCreate(Resource):
@@ -385,8 +574,10 @@ class ChatCreate(Resource):
         image_data = data.get('image')
         if image_data:
             try:
-                analysis = process_image(image_data)
-                full_prompt += f"\n[Image analysis: {analysis}]"
+                analysis = process_image(image_data, data.get('features'), data.get('pages'))
+                full_prompt += f"\n[Image analysis: {format_analysis(analysis)}]"
+            except VisionPoolSaturated as e:
+                return {"error": str(e)}, 503
             except Exception as e:
                 return {"error": f"Image processing failed: {str(e)}"}, 400
         
@@ -395,8 +586,12 @@ class ChatCreate(Resource):
         
         if user:
             user.update(push__chatIds=new_chat)
+
+        if wants_async(data):
+            body, status = queue_reply(new_chat, ChatMessage(prompt=prompt), 'text', full_prompt, cache_enabled('create'))
+            return {**body, "prompt": prompt}, status
         
-        ai_response = generate_text_response(full_prompt)
+        ai_response = generate(full_prompt, 'text', cache=cache_enabled('create'))
         new_msg = ChatMessage(prompt=prompt, response=ai_response)
         new_msg.save()
         new_chat.update(push__chat_messages=new_msg)
@@ -461,6 +656,36 @@ class MessageDetail(Resource):
             "response": msg.response
         }, 200
 
+@chat_ns.route('/<chat_id>/message/<message_id>/status')
+class MessageStatus(Resource):
+    def get(self, chat_id, message_id):
+        """
+        Poll a queued reply: pending, running, done (with the response) or failed (with the error).
+        A chat that belongs to a user is only readable with that user's token; anonymous chats are
+        not linked to any account, so, as with /send, knowing the chat id is what grants access.
+        """
+        chat = Chat.objects(id=chat_id).first()
+        if not chat:
+            return {"error": "Chat not found"}, 404
+        owner = User.objects(chatIds=chat.id).only('id').first()
+        if owner is not None:
+            token = request.cookies.get('token')
+            auth_header = request.headers.get('Authorization', '')
+            if not token and auth_header.startswith('Bearer '):
+                token = auth_header.split(' ')[1]
+            user = verify_token(token) if token else None
+            if not user or user.id != owner.id:
+                return {"error": "Unauthorized"}, 401
+        msg = next((m for m in list(chat.chat_messages) + list(chat.editor_messages) if str(m.id) == message_id), None)
+        if not msg:
+            return {"error": "Message not found"}, 404
+        body = {"message_id": str(msg.id), "status": msg.status}
+        if msg.status == 'done':
+            body["response"] = msg.response
+        elif msg.status == 'failed':
+            body["error"] = msg.error
+        return body, 200
+
 @chat_ns.route('/<chat_id>/messages')
 class ChatMessages(Resource):
     @token_required
@@ -475,11 +700,14 @@ class ChatMessages(Resource):
         for m in chat.chat_messages:
             index_single = m.prompt.find("'")
             index_double = m.prompt.find('"')
+            index_analysis = m.prompt.find("\n[Image analysis:")
             if index_single == -1:
                 index_single = len(m.prompt)
             if index_double == -1:
                 index_double = len(m.prompt)
-            index = min(index_single, index_double)
+            if index_analysis == -1:
+                index_analysis = len(m.prompt)
+            index = min(index_single, index_double, index_analysis)
             prompt_text = m.prompt[:index].strip()
             chat_messages_list.append({
                 "message_id": str(m.id),
@@ -0,0 +1,36 @@
+import argparse
+import json
+from helpers.detector_helper import BACKENDS, export_detector, validate_detectors
+from helpers.image_helper import load_image_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the UI detector to CPU backends and check parity with the .pt model")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export yolov8n_trained.pt for a backend")
+    export.add_argument("--backend", choices=[b for b in BACKENDS if b != 'torch'], required=True)
+    export.add_argument("--int8", action="store_true", help="Write the int8-quantized variant")
+    export.add_argument("--data", help="Dataset yaml of UI screenshots used to calibrate OpenVINO int8 (required with --int8)")
+    export.add_argument("--imgsz", type=int, default=640)
+
+    validate = commands.add_parser("validate", help="Compare exported backends against the .pt model")
+    validate.add_argument("--samples", required=True, help="Directory of sample screenshots")
+    validate.add_argument("--backend", action="append", choices=[b for b in BACKENDS if b != 'torch'], required=True)
+    validate.add_argument("--int8", action="store_true", help="Also validate the int8 variants")
+    validate.add_argument("--iou", type=float, default=0.5)
+    validate.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "export" and args.backend == 'openvino' and args.int8 and not args.data:
+        parser.error("--data is required for --backend openvino --int8")
+    if args.command == "export":
+        print(export_detector(args.backend, args.int8, args.data, args.imgsz))
+    else:
+        variants = [(backend, False) for backend in args.backend]
+        if args.int8:
+            variants += [(backend, True) for backend in args.backend]
+        report = validate_detectors(load_image_dir(args.samples), variants, args.iou, args.repeats)
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
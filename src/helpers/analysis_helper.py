@@ -0,0 +1,126 @@
+import os
+import re
+
+# How image analysis is written into LLM prompts: 'compact' (versioned table) or 'repr' (legacy).
+ANALYSIS_FORMAT = os.getenv('ANALYSIS_FORMAT', 'compact')
+ANALYSIS_FORMAT_VERSION = 1
+LAYOUT_FORMAT_VERSION = 2
+
+CLASS_CODES = {
+    'button': 'B', 'field': 'F', 'heading': 'H', 'iframe': 'I',
+    'image': 'M', 'label': 'L', 'link': 'A', 'text': 'T',
+}
+
+def _hex(color):
+    return '%02x%02x%02x' % tuple(max(0, min(255, int(c))) for c in color)
+
+def _clean(text):
+    return ' '.join(str(text).replace('|', '/').split())
+
+def _columns(result_data):
+    """Optional columns, in order, for the per-box features present in result_data."""
+    keys = set().union(*(entry.keys() for entry in result_data))
+    columns = []
+    if 'color_distribution' in keys:
+        columns.append(('colors', lambda e: ','.join(_hex(c) for c in dict.fromkeys(map(tuple, e.get('color_distribution') or [])))))
+    if 'text' in keys:
+        columns.append(('text', lambda e: _clean(e['text']) if e.get('text') else ''))
+    if 'gradient' in keys:
+        columns.append(('grad', lambda e: '%d/%d' % (e['gradient']['mean_angle'] or 0, e['gradient']['mean_magnitude']) if e.get('gradient') else ''))
+    if 'edge_density' in keys:
+        columns.append(('edge', lambda e: '%.2f' % e['edge_density'] if e.get('edge_density') is not None else ''))
+    return columns
+
+def _element_row(entry, columns):
+    bbox = entry['bbox']
+    row = [
+        CLASS_CODES.get(entry['class_name'], entry['class_name']),
+        str(round(bbox['center_x'])), str(round(bbox['center_y'])),
+        str(round(bbox['width'])), str(round(bbox['height'])),
+        str(round(entry['confidence'] * 100)),
+    ]
+    row.extend(render(entry) for _, render in columns)
+    return '|'.join(row).rstrip('|')
+
+def _header(version, elements, columns):
+    used = dict.fromkeys(entry['class_name'] for entry in elements)
+    legend = ' '.join(f"{CLASS_CODES.get(name, name)}={name}" for name in used)
+    return [
+        f"ui-analysis/v{version} cols=cls|x|y|w|h|conf%" + ''.join('|' + name for name, _ in columns),
+        f"cls: {legend}",
+    ]
+
+def _layout_lines(node, elements, columns, depth, lines):
+    indent = ' ' * depth
+    if isinstance(node, int):
+        lines.append(indent + _element_row(elements[node], columns))
+        return
+    x_min, y_min, x_max, y_max = node['bbox']
+    lines.append(f"{indent}{node['type']} {x_min},{y_min} {x_max - x_min}x{y_max - y_min}")
+    for child in node['children']:
+        _layout_lines(child, elements, columns, depth + 1, lines)
+
+def encode_analysis(analysis):
+    """
+    Encode process_image output compactly. A header names the format version and columns and
+    a legend lists the class codes used. Each box is one '|'-separated row with integer pixel
+    center/size, confidence in percent, deduplicated hex colors (most dominant first) and text.
+    v1 lists the rows flat; v2 (a build_layout result) nests them under indented
+    page/section/row/column/group lines giving each container's origin and size.
+    """
+    if isinstance(analysis, dict):
+        elements, layout, version = analysis['elements'], analysis['layout'], LAYOUT_FORMAT_VERSION
+    else:
+        elements, layout, version = analysis, None, ANALYSIS_FORMAT_VERSION
+    if not elements:
+        return f"ui-analysis/v{version} no elements"
+    columns = _columns(elements)
+    lines = _header(version, elements, columns)
+    if layout is None:
+        lines.extend(_element_row(entry, columns) for entry in elements)
+    else:
+        _layout_lines(layout, elements, columns, 0, lines)
+    return '\n'.join(lines)
+
+def format_analysis(analysis):
+    """Render process_image output for a prompt in the configured ANALYSIS_FORMAT."""
+    if isinstance(analysis, dict) and 'pages' in analysis:
+        return '\n\n'.join(f"page {page['page']}:\n{format_analysis(page['analysis'])}" for page in analysis['pages'])
+    if isinstance(analysis, (list, dict)) and ANALYSIS_FORMAT == 'compact':
+        return encode_analysis(analysis)
+    return str(analysis)
+
+def format_analyses(named_analyses):
+    """Render (name, analysis) pairs from one multi-image request as a single prompt block."""
+    return '\n\n'.join(
+        f"image {index} {name}:\n{format_analysis(analysis)}"
+        for index, (name, analysis) in enumerate(named_analyses, 1)
+    )
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text):
+    """Rough LLM token count: words and individual punctuation marks."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+def clip_tokens(text, tokens):
+    """text cut after its first tokens estimated tokens, marked with " ..." when cut."""
+    for count, match in enumerate(_TOKEN_PATTERN.finditer(text)):
+        if count == tokens:
+            return text[:match.start()].rstrip() + " ..."
+    return text
+
+def encoding_savings(analyses):
+    """Compare the legacy repr against encode_analysis over a list of analyses (flat or layout)."""
+    legacy = ''.join(str(analysis) for analysis in analyses)
+    compact = ''.join(encode_analysis(analysis) for analysis in analyses)
+    legacy_tokens, compact_tokens = estimate_tokens(legacy), estimate_tokens(compact)
+    return {
+        "images": len(analyses),
+        "repr_chars": len(legacy),
+        "compact_chars": len(compact),
+        "char_reduction": round(1 - len(compact) / len(legacy), 4) if legacy else 0.0,
+        "repr_tokens": legacy_tokens,
+        "compact_tokens": compact_tokens,
+        "token_reduction": round(1 - compact_tokens / legacy_tokens, 4) if legacy_tokens else 0.0,
+    }
@@ -0,0 +1,136 @@
+import numpy as np
+
+def box_area(boxes):
+    """Areas of (N, 4+) boxes laid out as [x_min, y_min, x_max, y_max, ...]."""
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+def box_intersection(a, b):
+    """Pairwise intersection areas between (N, 4+) and (M, 4+) boxes as an (N, M) array."""
+    x_min = np.maximum(a[:, None, 0], b[None, :, 0])
+    y_min = np.maximum(a[:, None, 1], b[None, :, 1])
+    x_max = np.minimum(a[:, None, 2], b[None, :, 2])
+    y_max = np.minimum(a[:, None, 3], b[None, :, 3])
+    return np.clip(x_max - x_min, 0, None) * np.clip(y_max - y_min, 0, None)
+
+def box_iou(a, b):
+    """Pairwise intersection-over-union between (N, 4+) and (M, 4+) boxes as an (N, M) array."""
+    inter = box_intersection(a, b)
+    union = box_area(a)[:, None] + box_area(b)[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def nms(detections, iou_threshold):
+    """Greedy class-aware non-maximum suppression over (N, 6) detections; returns kept row indices."""
+    keep = []
+    order = np.argsort(-detections[:, 4], kind='stable')
+    while len(order):
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        ious = box_iou(detections[best:best + 1], detections[rest])[0]
+        order = rest[(ious < iou_threshold) | (detections[rest, 5] != detections[best, 5])]
+    return np.array(keep, dtype=int)
+
+def suppress_contained(detections, containment):
+    """
+    Class-aware containment merging over (N, 6) detections: a box lying at least containment
+    inside a larger same-class box is folded into it, which keeps the higher confidence.
+    Returns the kept row indices and their (possibly raised) confidences.
+    """
+    if len(detections) < 2:
+        return np.arange(len(detections)), detections[:, 4].copy()
+    areas = box_area(detections)
+    covered = box_intersection(detections, detections) / np.maximum(areas, 1e-9)[:, None]
+    index = np.arange(len(detections))
+    # Row i is inside column j; equal-area ties go to the lower index so one box always survives.
+    larger = (areas[None, :] > areas[:, None]) | ((areas[None, :] == areas[:, None]) & (index[None, :] < index[:, None]))
+    inside = (covered >= containment) & larger & (detections[:, None, 5] == detections[None, :, 5])
+    keep = np.where(~inside.any(axis=1))[0]
+    confidences = np.where(inside[:, keep], detections[:, None, 4], 0).max(axis=0, initial=0)
+    return keep, np.maximum(detections[keep, 4], confidences)
+
+def filter_detections(detections, min_confidence, iou_threshold, containment):
+    """
+    Clean up (N, 6) detections before any per-box work: drop boxes under their class's
+    min_confidence (an array indexed by class id), run class-aware NMS at iou_threshold, then
+    fold same-class boxes contained in larger ones. Returns the kept detections and how many
+    boxes each step dropped.
+    """
+    dropped = {"confidence": 0, "overlap": 0, "contained": 0}
+    if not len(detections):
+        return detections, dropped
+    confident = detections[detections[:, 4] >= min_confidence[detections[:, 5].astype(int)]]
+    dropped["confidence"] = len(detections) - len(confident)
+    if not len(confident):
+        return confident, dropped
+    distinct = confident[np.sort(nms(confident, iou_threshold))]
+    dropped["overlap"] = len(confident) - len(distinct)
+    keep, confidences = suppress_contained(distinct, containment)
+    kept = distinct[keep]
+    kept[:, 4] = confidences
+    dropped["contained"] = len(distinct) - len(kept)
+    return kept, dropped
+
+def _interval_iou(a_min, a_max, b_min, b_max):
+    inter = np.clip(np.minimum(a_max[:, None], b_max[None, :]) - np.maximum(a_min[:, None], b_min[None, :]), 0, None)
+    union = (a_max - a_min)[:, None] + (b_max - b_min)[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+def _join_cut_pieces(detections, owners, min_alignment=0.7):
+    """
+    Union same-class boxes from different tiles that overlap and line up along the uncut axis,
+    i.e. pieces of one element split by tile edges.
+    """
+    if len(detections) < 2:
+        return detections
+    alignment = np.maximum(
+        _interval_iou(detections[:, 0], detections[:, 2], detections[:, 0], detections[:, 2]),
+        _interval_iou(detections[:, 1], detections[:, 3], detections[:, 1], detections[:, 3])
+    )
+    linked = (
+        (box_intersection(detections, detections) > 0) & (alignment >= min_alignment) &
+        (detections[:, None, 5] == detections[None, :, 5]) & (owners[:, None] != owners[None, :])
+    )
+    # Connected components by propagating the smallest index through the link graph.
+    labels = np.arange(len(detections))
+    while True:
+        spread = np.where(linked, labels[None, :], labels[:, None]).min(axis=1)
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+    merged = []
+    for label in np.unique(labels):
+        group = detections[labels == label]
+        merged.append([group[:, 0].min(), group[:, 1].min(), group[:, 2].max(), group[:, 3].max(), group[:, 4].max(), group[0, 5]])
+    return np.array(merged, dtype=detections.dtype)
+
+def merge_tile_detections(outputs, tiles, shape, iou_threshold, edge_margin=2.0):
+    """
+    Shift per-tile (N, 6) detections into page coordinates and deduplicate them. Boxes cut by an
+    internal tile edge are dropped when a same-class box seen whole in another tile covers them;
+    cut pieces of elements larger than the tile overlap are joined into one box, and remaining
+    duplicates from overlapping tiles are removed with class-aware NMS.
+    """
+    height, width = shape[:2]
+    shifted, cut, owners = [], [], []
+    for index, (detections, (x_min, y_min, x_max, y_max)) in enumerate(zip(outputs, tiles)):
+        detections = detections.copy()
+        cut.append(
+            ((y_min > 0) & (detections[:, 1] <= edge_margin)) |
+            ((y_max < height) & (detections[:, 3] >= y_max - y_min - edge_margin)) |
+            ((x_min > 0) & (detections[:, 0] <= edge_margin)) |
+            ((x_max < width) & (detections[:, 2] >= x_max - x_min - edge_margin))
+        )
+        detections[:, [0, 2]] += x_min
+        detections[:, [1, 3]] += y_min
+        shifted.append(detections)
+        owners.append(np.full(len(detections), index))
+    if not shifted:
+        return np.zeros((0, 6), dtype=np.float32)
+    detections, cut, owners = np.concatenate(shifted), np.concatenate(cut), np.concatenate(owners)
+    whole = detections[~cut]
+    partial, partial_owners = detections[cut], owners[cut]
+    if len(partial) and len(whole):
+        coverage = box_intersection(partial, whole) / np.maximum(box_area(partial), 1e-9)[:, None]
+        covered = ((coverage >= 0.5) & (partial[:, None, 5] == whole[None, :, 5])).any(axis=1)
+        partial, partial_owners = partial[~covered], partial_owners[~covered]
+    detections = np.concatenate([whole, _join_cut_pieces(partial, partial_owners)])
+    return detections[np.sort(nms(detections, iou_threshold))] if len(detections) else detections
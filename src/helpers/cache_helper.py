@@ -0,0 +1,191 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from infra.db.models import CacheEntry
+
+def digest(*parts):
+    """Hash strings, bytes and contiguous buffers (e.g. NumPy arrays) into one hex key."""
+    hasher = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        hasher.update(memoryview(part))
+        hasher.update(b'\x00')
+    return hasher.hexdigest()
+
+def file_digest(path):
+    """Content hash of a file, used to version cache keys by model weights."""
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def path_digest(path):
+    """Content hash of a file, or of every file under a directory (e.g. an OpenVINO export)."""
+    if not os.path.isdir(path):
+        return file_digest(path)
+    parts = []
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            parts.extend([os.path.relpath(full, path), file_digest(full)])
+    return digest(*parts)
+
+class LRUCache:
+    """
+    Thread-safe in-process cache bounded by entry count with least-recently-used eviction.
+    With ttl (seconds), entries older than ttl are treated as misses and dropped.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._expires = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                if self.ttl and self._expires[key] <= time.monotonic():
+                    del self._data[key], self._expires[key]
+                    self.expirations += 1
+                    self.misses += 1
+                    return None
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl:
+                self._expires[key] = time.monotonic() + self.ttl
+            while len(self._data) > self.max_size:
+                evicted, _ = self._data.popitem(last=False)
+                self._expires.pop(evicted, None)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+            if self.ttl:
+                stats["expirations"] = self.expirations
+            return stats
+
+class MongoCache:
+    """
+    JSON values shared across workers and restarts in the cache_entries collection.
+    The namespace is trimmed back to max_entries by least recent use after each write, and
+    with ttl (seconds) entries written longer ago than ttl are misses and get deleted.
+    Database errors are counted and treated as misses so a cache outage never fails a request.
+    """
+
+    def __init__(self, namespace, max_entries, ttl=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        try:
+            entry = CacheEntry.objects(namespace=self.namespace, key=key).first()
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.ttl and entry.created_at.replace(tzinfo=datetime.timezone.utc) <= \
+                    datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.ttl):
+                entry.delete()
+                self.misses += 1
+                return None
+            entry.update(set__last_used=datetime.datetime.now(datetime.timezone.utc))
+            self.hits += 1
+            return json.loads(entry.value)
+        except Exception:
+            self.errors += 1
+            return None
+
+    def set(self, key, value):
+        try:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            CacheEntry.objects(namespace=self.namespace, key=key).update_one(
+                set__value=json.dumps(value),
+                set__created_at=now,
+                set__last_used=now,
+                upsert=True
+            )
+            self._trim()
+        except Exception:
+            self.errors += 1
+
+    def recent(self, limit):
+        """Up to limit (key, value) pairs, most recently used first, for rebuilding in-memory indexes."""
+        try:
+            entries = CacheEntry.objects(namespace=self.namespace).order_by('-last_used').limit(limit)
+            return [(entry.key, json.loads(entry.value)) for entry in entries]
+        except Exception:
+            self.errors += 1
+            return []
+
+    def _trim(self):
+        entries = CacheEntry.objects(namespace=self.namespace)
+        excess = entries.count() - self.max_entries
+        if excess > 0:
+            stale = [e.id for e in entries.order_by('last_used').only('id').limit(excess)]
+            CacheEntry.objects(id__in=stale).delete()
+
+    def stats(self):
+        return {
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+class TieredCache:
+    """In-process LRU in front of an optional MongoCache; Mongo hits are promoted to memory."""
+
+    def __init__(self, namespace, max_size, mongo_enabled=False, mongo_max_entries=10000, ttl=None):
+        self.memory = LRUCache(max_size, ttl)
+        self.mongo = MongoCache(namespace, mongo_max_entries, ttl) if mongo_enabled else None
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.mongo is not None:
+            value = self.mongo.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.mongo is not None:
+            self.mongo.set(key, value)
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.mongo is not None:
+            stats["mongo"] = self.mongo.stats()
+        return stats
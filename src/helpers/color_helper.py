@@ -0,0 +1,122 @@
+import os
+import numpy as np
+
+# Accuracy/speed knobs: bits kept per RGB channel when bucketing colors, the most
+# pixels sampled from one crop, the most histogram buckets clustered per crop and
+# the number of k-means refinement passes over those buckets.
+COLOR_QUANT_BITS = int(os.getenv('COLOR_QUANT_BITS', 5))
+COLOR_MAX_SAMPLES = int(os.getenv('COLOR_MAX_SAMPLES', 4096))
+COLOR_MAX_BUCKETS = int(os.getenv('COLOR_MAX_BUCKETS', 64))
+COLOR_KMEANS_ITERATIONS = int(os.getenv('COLOR_KMEANS_ITERATIONS', 8))
+
+def _sample_pixels(crop, max_samples):
+    """Subsample a crop on a regular grid so it yields at most ~max_samples pixels."""
+    height, width = crop.shape[:2]
+    step = max(1, int(np.ceil(np.sqrt(height * width / float(max_samples))))) if max_samples else 1
+    return crop[::step, ::step].reshape(-1, 3)
+
+def _weighted_kmeans(points, weights, num_colors, iterations):
+    """
+    Batched weighted Lloyd's k-means: points (crops, buckets, 3), weights (crops, buckets).
+    Centers are seeded deterministically with weighted farthest-point selection.
+    """
+    crops = points.shape[0]
+    rows = np.arange(crops)
+    centers = np.empty((crops, num_colors, 3))
+    centers[:, 0] = points[rows, weights.argmax(axis=1)]
+    nearest = ((points - centers[:, :1]) ** 2).sum(axis=2)
+    for c in range(1, num_colors):
+        score = weights * nearest
+        pick = score.argmax(axis=1)
+        # Crops with no colors left to separate reuse their dominant color.
+        exhausted = score[rows, pick] <= 0
+        centers[:, c] = np.where(exhausted[:, None], centers[:, 0], points[rows, pick])
+        nearest = np.minimum(nearest, ((points - centers[:, c:c + 1]) ** 2).sum(axis=2))
+
+    for _ in range(iterations):
+        distances = ((points[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(axis=3)
+        membership = np.eye(num_colors)[distances.argmin(axis=2)] * weights[:, :, None]
+        mass = membership.sum(axis=1)
+        totals = np.einsum('nbk,nbc->nkc', membership, points)
+        updated = totals / np.maximum(mass, 1e-9)[:, :, None]
+        centers = np.where(mass[:, :, None] > 0, updated, centers)
+
+    distances = ((points[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(axis=3)
+    mass = (np.eye(num_colors)[distances.argmin(axis=2)] * weights[:, :, None]).sum(axis=1)
+    return centers, mass
+
+def dominant_colors_batch(image, boxes, num_colors=5, bits=None, max_samples=None,
+                          max_buckets=None, iterations=None):
+    """
+    Return the dominant RGB colors of every box of one BGR image in a single batched pass.
+    Sampled pixels are bucketed into a (2**bits)**3 color histogram per box, and a weighted
+    k-means over each box's most populated buckets stands in for full-pixel KMeans.
+    Colors are ordered most dominant first; empty boxes get an empty list.
+    """
+    bits = COLOR_QUANT_BITS if bits is None else bits
+    max_samples = COLOR_MAX_SAMPLES if max_samples is None else max_samples
+    max_buckets = COLOR_MAX_BUCKETS if max_buckets is None else max_buckets
+    iterations = COLOR_KMEANS_ITERATIONS if iterations is None else iterations
+    if not boxes:
+        return []
+
+    samples, owners = [], []
+    for index, (x_min, y_min, x_max, y_max) in enumerate(boxes):
+        crop = image[int(y_min):int(y_max), int(x_min):int(x_max)]
+        if crop.size == 0:
+            continue
+        pixels = _sample_pixels(crop, max_samples)
+        samples.append(pixels)
+        owners.append(np.full(len(pixels), index, dtype=np.int64))
+    if not samples:
+        return [[] for _ in boxes]
+
+    pixels = np.concatenate(samples)[:, ::-1].astype(np.int64)  # BGR -> RGB
+    owners = np.concatenate(owners)
+    quantized = pixels >> (8 - bits)
+    buckets = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+    keys = owners * (1 << (3 * bits)) + buckets
+
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    sums = np.stack([np.bincount(inverse, weights=pixels[:, c], minlength=len(unique_keys)) for c in range(3)], axis=1)
+    means = sums / counts[:, None]
+    key_owner = unique_keys >> (3 * bits)
+
+    # Keep each box's most populated buckets, packed into a (boxes, max_buckets) grid.
+    order = np.lexsort((-counts, key_owner))
+    sorted_owner = key_owner[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_owner, sorted_owner, side='left')
+    keep = rank < max_buckets
+    present, slot_owner = np.unique(sorted_owner[keep], return_inverse=True)
+    points = np.zeros((len(present), max_buckets, 3))
+    weights = np.zeros((len(present), max_buckets))
+    points[slot_owner, rank[keep]] = means[order[keep]]
+    weights[slot_owner, rank[keep]] = counts[order[keep]]
+
+    centers, mass = _weighted_kmeans(points, weights, num_colors, iterations)
+    ranking = np.argsort(-mass, axis=1, kind='stable')
+    centers = np.rint(np.take_along_axis(centers, ranking[:, :, None], axis=1)).astype(int)
+
+    colors = [[] for _ in boxes]
+    for owner, palette in zip(present.tolist(), centers.tolist()):
+        colors[owner] = palette
+    return colors
+
+def dominant_colors(image, num_colors=5, bits=None, max_samples=None):
+    """Return the dominant RGB colors of a single BGR image."""
+    height, width = image.shape[:2]
+    return dominant_colors_batch(image, [(0, 0, width, height)], num_colors, bits, max_samples)[0]
+
+def kmeans_color_error(image, num_colors=5, bits=None, max_samples=None):
+    """
+    Compare dominant_colors against the original full-pixel KMeans result for one BGR crop.
+    Returns the largest and mean RGB distance from each KMeans center to its nearest color.
+    """
+    from sklearn.cluster import KMeans
+    pixels = image[:, :, ::-1].reshape((-1, 3))
+    kmeans = KMeans(n_clusters=num_colors, random_state=42)
+    kmeans.fit(pixels)
+    reference = np.array(kmeans.cluster_centers_, dtype=float)
+    fast = np.array(dominant_colors(image, num_colors, bits, max_samples), dtype=float)
+    distances = np.linalg.norm(reference[:, None, :] - fast[None, :, :], axis=2).min(axis=1)
+    return float(distances.max()), float(distances.mean())
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from infra.db.models import Chat, ChatMessage, EditorMessage
+from helpers.analysis_helper import clip_tokens, estimate_tokens
+from helpers.llm_helper import generate
+from helpers.metrics_helper import register_metrics
+
+# Tokens of conversation history sent with each prompt (rolling summary plus recent turns); 0 sends none.
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 4000))
+# Most recent turns kept verbatim; older ones are folded into the chat's rolling summary.
+CONTEXT_RECENT_TURNS = int(os.getenv('CONTEXT_RECENT_TURNS', 6))
+# Turns that must fall out of the window before the summary is updated, so it is not rewritten every turn.
+CONTEXT_SUMMARY_BATCH = int(os.getenv('CONTEXT_SUMMARY_BATCH', 4))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv('CONTEXT_SUMMARY_TOKENS', 600))
+
+# Conversation streams of a chat: (message model, list field, summary field, summarized turns field)
+_STREAMS = {
+    'chat': (ChatMessage, 'chat_messages', 'summary', 'summary_turns'),
+    'editor': (EditorMessage, 'editor_messages', 'code_summary', 'code_summary_turns'),
+}
+
+# Summary updates run here, after the request that triggered them has moved on to its own reply.
+_fold_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='context-summary')
+_folding = set()
+_lock = threading.Lock()
+_counters = {"builds": 0, "folds": 0, "fold_errors": 0, "dropped_turns": 0, "tokens": 0, "seconds": 0.0}
+
+def _stats():
+    with _lock:
+        builds = _counters["builds"]
+        return {
+            "builds": builds,
+            "folds": _counters["folds"],
+            "fold_errors": _counters["fold_errors"],
+            "folds_pending": len(_folding),
+            "dropped_turns": _counters["dropped_turns"],
+            "avg_tokens": round(_counters["tokens"] / builds, 1) if builds else 0.0,
+            "avg_build_ms": round(_counters["seconds"] * 1000 / builds, 3) if builds else 0.0,
+        }
+
+register_metrics('context', _stats)
+
+def _count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+def _turn(msg):
+    # A patched code reply is represented by its patch, not the whole project it produced
+    return f"User: {msg.prompt}\nBot: {getattr(msg, 'patch', None) or msg.response}\n"
+
+def _load(message_model, ids):
+    """Messages for ids in one query, in the order of ids; missing and unanswered ones are skipped."""
+    if not ids:
+        return []
+    found = {m.id: m for m in message_model.objects(id__in=ids)}
+    return [found[i] for i in ids if i in found and found[i].response]
+
+def summarize(summary, turns):
+    """Fold turns into the previous rolling summary with the text model."""
+    transcript = ''.join(clip_tokens(_turn(msg), CONTEXT_TOKEN_BUDGET // 2) for msg in turns)
+    prompt = (
+        "Update the summary of an ongoing conversation between a user and an assistant that builds websites. "
+        "Keep the user's requirements, decisions and the current state of the design, drop small talk, "
+        f"and answer with the summary only, in at most {CONTEXT_SUMMARY_TOKENS * 3 // 4} words.\n\n"
+        f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    return clip_tokens(generate(prompt, 'text').strip(), CONTEXT_SUMMARY_TOKENS)
+
+def _fold(chat_id, stream, summary, summarized, ids, fold_to):
+    """Fold the turns ids into the stored summary, unless another fold got there first."""
+    message_model, _, summary_field, turns_field = _STREAMS[stream]
+    try:
+        turns = _load(message_model, ids)
+        folded = summarize(summary, turns) if turns else summary
+        current = [summarized, None] if summarized == 0 else [summarized]
+        Chat.objects(id=chat_id, **{f'{turns_field}__in': current}).update_one(
+            **{f'set__{summary_field}': folded, f'set__{turns_field}': fold_to})
+        _count("folds")
+    except Exception:
+        traceback.print_exc()
+        _count("fold_errors")
+    finally:
+        with _lock:
+            _folding.discard((chat_id, stream))
+
+def _schedule_fold(chat_id, stream, summary, summarized, ids, fold_to):
+    """Queue a summary update for a chat stream; at most one per stream is pending in a process."""
+    with _lock:
+        if (chat_id, stream) in _folding:
+            return
+        _folding.add((chat_id, stream))
+    _fold_pool.submit(_fold, chat_id, stream, summary, summarized, ids, fold_to)
+
+def build_context(chat, stream='chat'):
+    """
+    Conversation history to put in front of the next prompt of chat, within CONTEXT_TOKEN_BUDGET:
+    the chat's rolling summary followed by its recent turns verbatim, newest kept first.
+    stream is 'chat' for chat messages or 'editor' for code messages.
+
+    Only message ids and the summary are read from the chat, plus one query for the recent turns.
+    Once CONTEXT_SUMMARY_BATCH turns have fallen out of the last CONTEXT_RECENT_TURNS, a background
+    update folds them into the summary stored on the chat, so each turn is summarized once and no
+    request waits for it; until it lands, the stored summary is used. A failed update is retried
+    on a later turn.
+    """
+    if CONTEXT_TOKEN_BUDGET <= 0:
+        return ""
+    started = time.perf_counter()
+    message_model, field, summary_field, turns_field = _STREAMS[stream]
+    doc = Chat.objects(id=chat.id).no_dereference().only(field, summary_field, turns_field).first()
+    if doc is None:
+        return ""
+    ids = [getattr(ref, 'id', ref) for ref in getattr(doc, field) or []]
+    summary = getattr(doc, summary_field) or ""
+    summarized = min(getattr(doc, turns_field) or 0, len(ids))
+
+    fold_to = len(ids) - CONTEXT_RECENT_TURNS
+    if fold_to - summarized >= CONTEXT_SUMMARY_BATCH:
+        _schedule_fold(chat.id, stream, summary, summarized, ids[summarized:fold_to], fold_to)
+
+    header = f"Summary of the earlier conversation:\n{summary}\n\n" if summary else ""
+    remaining = CONTEXT_TOKEN_BUDGET - estimate_tokens(header)
+    # Unsummarized turns beyond the window plus one batch are only left while a summary update is
+    # pending or failing; they are not sent meanwhile.
+    start = max(summarized, len(ids) - CONTEXT_RECENT_TURNS - CONTEXT_SUMMARY_BATCH)
+    recent = _load(message_model, ids[start:])
+    kept = []
+    for msg in reversed(recent):
+        text = _turn(msg)
+        remaining -= estimate_tokens(text)
+        if remaining < 0:
+            break
+        kept.append(text)
+    context = header + ''.join(reversed(kept))
+    _count("dropped_turns", len(recent) - len(kept))
+    _count("builds")
+    _count("tokens", estimate_tokens(context))
+    _count("seconds", time.perf_counter() - started)
+    return context
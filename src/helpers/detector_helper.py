@@ -0,0 +1,142 @@
+import os
+import time
+import numpy as np
+from helpers.box_helper import box_iou
+from helpers.cache_helper import path_digest
+
+YOLO_WEIGHTS = 'src/controllers/yolov8n_trained.pt'
+
+# Which runtime serves the UI detector: torch (the .pt weights), onnx (ONNX Runtime) or openvino,
+# optionally the int8-quantized export. DETECTOR_WEIGHTS points at a non-default export.
+DETECTOR_BACKEND = os.getenv('DETECTOR_BACKEND', 'torch')
+DETECTOR_INT8 = os.getenv('DETECTOR_INT8', 'false').lower() == 'true'
+DETECTOR_WEIGHTS = os.getenv('DETECTOR_WEIGHTS')
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+def detector_path(backend=None, int8=None):
+    """Location of the weights or exported model for a backend, following ultralytics' export naming."""
+    if backend is None and int8 is None and DETECTOR_WEIGHTS:
+        return DETECTOR_WEIGHTS
+    backend = backend or DETECTOR_BACKEND
+    int8 = DETECTOR_INT8 if int8 is None else int8
+    if backend not in BACKENDS:
+        raise Exception(f"Unknown detector backend: {backend}")
+    stem = YOLO_WEIGHTS[:-len('.pt')]
+    suffix = '_int8' if int8 else ''
+    if backend == 'torch':
+        if int8:
+            raise Exception("int8 is only available for the onnx and openvino backends")
+        return YOLO_WEIGHTS
+    if backend == 'onnx':
+        return f"{stem}{suffix}.onnx"
+    return f"{stem}{suffix}_openvino_model"
+
+def load_detector(backend=None, int8=None):
+    """Load the 8-class UI detector on the configured backend; all share the ultralytics predict API."""
+    from ultralytics import YOLO
+    return YOLO(detector_path(backend, int8), task='detect')
+
+def detector_version(backend=None, int8=None):
+    """Content hash of the model actually served, so switching backends invalidates cached analyses."""
+    path = detector_path(backend, int8)
+    return f"{backend or DETECTOR_BACKEND}:{path_digest(path)}"
+
+def export_detector(backend, int8=False, data=None, imgsz=640):
+    """
+    Export YOLO_WEIGHTS for backend and return the written path. ONNX int8 uses ONNX Runtime
+    dynamic quantization; OpenVINO int8 is calibrated by ultralytics on the `data` dataset yaml.
+    """
+    from ultralytics import YOLO
+    if backend == 'torch':
+        return YOLO_WEIGHTS
+    model = YOLO(YOLO_WEIGHTS)
+    if backend == 'onnx':
+        exported = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if not int8:
+            return exported
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        target = detector_path('onnx', True)
+        quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+        return target
+    if backend == 'openvino':
+        if int8 and not data:
+            raise Exception("OpenVINO int8 export needs a dataset yaml of UI screenshots to calibrate on")
+        return model.export(format='openvino', imgsz=imgsz, dynamic=True, int8=int8, data=data)
+    raise Exception(f"Unknown detector backend: {backend}")
+
+def _average_precision(predictions, references, iou_threshold):
+    """AP of one class's predictions against reference boxes, both lists of per-image arrays."""
+    total = sum(len(r) for r in references)
+    if total == 0:
+        return None
+    scored = []
+    for pred, ref in zip(predictions, references):
+        matched = np.zeros(len(ref), dtype=bool)
+        ious = box_iou(pred, ref) if len(pred) and len(ref) else np.zeros((len(pred), len(ref)))
+        for row in np.argsort(-pred[:, 4]) if len(pred) else []:
+            candidates = np.where(~matched & (ious[row] >= iou_threshold))[0]
+            hit = len(candidates) > 0
+            if hit:
+                matched[candidates[np.argmax(ious[row, candidates])]] = True
+            scored.append((pred[row, 4], hit))
+    if not scored:
+        return 0.0
+    scored.sort(key=lambda item: -item[0])
+    hits = np.array([hit for _, hit in scored], dtype=float)
+    true_positives = np.cumsum(hits)
+    recall = true_positives / total
+    precision = true_positives / np.arange(1, len(hits) + 1)
+    # Area under the monotone precision envelope.
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    return float(np.sum(np.diff(np.concatenate(([0.0], recall))) * envelope))
+
+def detection_parity(predictions, references, iou_threshold=0.5):
+    """
+    Score per-image (N, 6) predictions against the .pt model's detections as ground truth:
+    mAP@iou_threshold over classes plus overall precision and recall of the box matches.
+    """
+    classes = sorted({int(c) for r in references for c in r[:, 5]} | {int(c) for p in predictions for c in p[:, 5]})
+    aps = []
+    for cls in classes:
+        ap = _average_precision([p[p[:, 5] == cls] for p in predictions], [r[r[:, 5] == cls] for r in references], iou_threshold)
+        if ap is not None:
+            aps.append(ap)
+    matched_predictions = matched_references = 0
+    for pred, ref in zip(predictions, references):
+        if len(pred) and len(ref):
+            hits = (box_iou(pred, ref) >= iou_threshold) & (pred[:, None, 5] == ref[None, :, 5])
+            matched_predictions += int(hits.any(axis=1).sum())
+            matched_references += int(hits.any(axis=0).sum())
+    predicted = sum(len(p) for p in predictions)
+    referenced = sum(len(r) for r in references)
+    return {
+        "map": round(float(np.mean(aps)), 4) if aps else None,
+        "iou_threshold": iou_threshold,
+        "precision": round(matched_predictions / predicted, 4) if predicted else None,
+        "recall": round(matched_references / referenced, 4) if referenced else None,
+        "boxes": predicted,
+        "reference_boxes": referenced,
+    }
+
+def benchmark_detector(images, backend, int8=False, repeats=1):
+    """Run every image through one backend, returning its detections and mean latency per image."""
+    from helpers.inference_helper import yolo_batch_predictor
+    predict = yolo_batch_predictor(load_detector(backend, int8))
+    predict(images[:1])
+    detections = []
+    started = time.perf_counter()
+    for _ in range(repeats):
+        detections = [predict([image])[0] for image in images]
+    latency_ms = (time.perf_counter() - started) * 1000 / (len(images) * repeats)
+    return detections, round(latency_ms, 2)
+
+def validate_detectors(images, variants, iou_threshold=0.5, repeats=1):
+    """Compare (backend, int8) variants against the .pt model on a sample set of BGR images."""
+    references, torch_latency = benchmark_detector(images, 'torch', repeats=repeats)
+    report = {"torch": {"latency_ms": torch_latency, "boxes": sum(len(r) for r in references)}}
+    for backend, int8 in variants:
+        detections, latency = benchmark_detector(images, backend, int8, repeats)
+        name = f"{backend}-int8" if int8 else backend
+        report[name] = {"latency_ms": latency, **detection_parity(detections, references, iou_threshold)}
+    return report
@@ -0,0 +1,101 @@
+import os
+from functools import cached_property
+import numpy as np
+from helpers.color_helper import dominant_colors_batch
+
+# Per-box features computed when a request does not pick its own (comma separated).
+IMAGE_FEATURES = os.getenv('IMAGE_FEATURES', 'colors,text')
+GRADIENT_HISTOGRAM_BINS = int(os.getenv('GRADIENT_HISTOGRAM_BINS', 8))
+
+class _FeatureContext:
+    """Per-image state shared by feature extractors, built only when first needed."""
+
+    def __init__(self, image, boxes, class_names):
+        self.image = image
+        self.boxes = boxes
+        self.class_names = class_names
+
+    @cached_property
+    def gray(self):
+        import cv2
+        return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+
+    def gray_crops(self):
+        for x_min, y_min, x_max, y_max in self.boxes:
+            yield self.gray[int(y_min):int(y_max), int(x_min):int(x_max)]
+
+def _colors(context):
+    return dominant_colors_batch(context.image, context.boxes)
+
+def _gradient(context):
+    """Summarise gradient orientation as a magnitude-weighted histogram plus mean angle."""
+    import cv2
+    summaries = []
+    for crop in context.gray_crops():
+        if crop.size == 0:
+            summaries.append(None)
+            continue
+        gx = cv2.Sobel(crop, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(crop, cv2.CV_32F, 0, 1, ksize=3)
+        magnitude, angle = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+        total = float(magnitude.sum())
+        histogram, _ = np.histogram(angle, bins=GRADIENT_HISTOGRAM_BINS, range=(0, 360), weights=magnitude)
+        radians = np.deg2rad(angle)
+        mean_angle = np.degrees(np.arctan2((magnitude * np.sin(radians)).sum(), (magnitude * np.cos(radians)).sum())) % 360
+        summaries.append({
+            "mean_magnitude": round(total / crop.size, 2),
+            "mean_angle": round(float(mean_angle), 1) if total else None,
+            "histogram": [round(float(v) / total, 3) if total else 0.0 for v in histogram]
+        })
+    return summaries
+
+def _edge_density(context):
+    """Fraction of crop pixels that Canny marks as edges."""
+    import cv2
+    densities = []
+    for crop in context.gray_crops():
+        if crop.size == 0:
+            densities.append(None)
+            continue
+        edges = cv2.Canny(crop, 100, 200)
+        densities.append(round(float(np.count_nonzero(edges)) / crop.size, 4))
+    return densities
+
+def _text(context):
+    """OCR text of boxes whose class carries text; None for other classes or when out of budget."""
+    from helpers.ocr_helper import TEXT_CLASSES, recognize_text
+    targets = [i for i, name in enumerate(context.class_names) if name in TEXT_CLASSES]
+    texts = [None] * len(context.boxes)
+    if targets:
+        for index, text in zip(targets, recognize_text(context.gray, [context.boxes[i] for i in targets])):
+            texts[index] = text
+    return texts
+
+# Feature name -> (result_data key, extractor over all boxes of one image).
+FEATURES = {
+    'colors': ('color_distribution', _colors),
+    'gradient': ('gradient', _gradient),
+    'edge_density': ('edge_density', _edge_density),
+    'text': ('text', _text),
+}
+
+def parse_features(value=None):
+    """Turn a comma separated string or list of feature names into a validated tuple."""
+    if value is None or value == '':
+        value = IMAGE_FEATURES
+    names = value.split(',') if isinstance(value, str) else value
+    names = tuple(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    unknown = [name for name in names if name not in FEATURES]
+    if unknown:
+        raise Exception(f"Unknown image features: {', '.join(unknown)}")
+    return names
+
+def extract_features(image, boxes, features, class_names=None):
+    """Run only the requested extractors and return one {key: value} dict per box."""
+    context = _FeatureContext(image, boxes, class_names or [None] * len(boxes))
+    per_box = [{} for _ in boxes]
+    for name in features:
+        key, extractor = FEATURES[name]
+        for entry, value in zip(per_box, extractor(context)):
+            entry[key] = value
+    return per_box
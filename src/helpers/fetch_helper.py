@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from helpers.cache_helper import LRUCache
+from helpers.metrics_helper import register_metrics
+
+IMAGE_FETCH_CONNECT_TIMEOUT = float(os.getenv('IMAGE_FETCH_CONNECT_TIMEOUT', 3))
+IMAGE_FETCH_READ_TIMEOUT = float(os.getenv('IMAGE_FETCH_READ_TIMEOUT', 10))
+IMAGE_FETCH_TOTAL_TIMEOUT = float(os.getenv('IMAGE_FETCH_TOTAL_TIMEOUT', 20))
+IMAGE_FETCH_MAX_BYTES = int(os.getenv('IMAGE_FETCH_MAX_BYTES', 20 * 1024 * 1024))
+IMAGE_FETCH_POOL_SIZE = int(os.getenv('IMAGE_FETCH_POOL_SIZE', 20))
+# Bodies with an ETag or Last-Modified are kept and revalidated with a conditional GET.
+IMAGE_FETCH_CACHE_SIZE = int(os.getenv('IMAGE_FETCH_CACHE_SIZE', 32))
+IMAGE_FETCH_CACHE_MAX_ITEM_BYTES = int(os.getenv('IMAGE_FETCH_CACHE_MAX_ITEM_BYTES', 4 * 1024 * 1024))
+
+ALLOWED_CONTENT_TYPES = ('image/', 'application/pdf', 'application/octet-stream')
+_CHUNK_SIZE = 64 * 1024
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=IMAGE_FETCH_POOL_SIZE, pool_maxsize=IMAGE_FETCH_POOL_SIZE)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+
+_cache = LRUCache(IMAGE_FETCH_CACHE_SIZE)
+_lock = threading.Lock()
+_counters = {"fetches": 0, "bytes": 0, "revalidated": 0, "rejected": 0}
+
+def _count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+def _stats():
+    with _lock:
+        return {**_counters, "cache": _cache.stats()}
+
+register_metrics('image_fetch', _stats)
+
+def _reject(message):
+    _count("rejected")
+    raise Exception(message)
+
+def fetch_image(url):
+    """
+    Download an image over the shared pooled session with connect/read timeouts, an overall
+    deadline and a max-bytes cutoff while streaming. Repeated URLs are served from memory
+    after a conditional GET answers 304.
+    """
+    cached = _cache.get(url)
+    headers = {}
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    deadline = time.monotonic() + IMAGE_FETCH_TOTAL_TIMEOUT
+    try:
+        response = _session.get(url, headers=headers, stream=True,
+                                timeout=(IMAGE_FETCH_CONNECT_TIMEOUT, IMAGE_FETCH_READ_TIMEOUT))
+    except requests.RequestException:
+        _reject("Failed to retrieve image from URL")
+    with response:
+        if response.status_code == 304 and cached is not None:
+            _count("revalidated")
+            return cached["body"]
+        if response.status_code != 200:
+            _reject("Failed to retrieve image from URL")
+        content_type = response.headers.get("Content-Type", "").lower()
+        if not content_type.startswith(ALLOWED_CONTENT_TYPES):
+            _reject(f"URL does not point to an image (Content-Type: {content_type or 'missing'})")
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > IMAGE_FETCH_MAX_BYTES:
+            _reject("Remote image is too large")
+
+        body = bytearray()
+        try:
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                body.extend(chunk)
+                if len(body) > IMAGE_FETCH_MAX_BYTES:
+                    _reject("Remote image is too large")
+                if time.monotonic() > deadline:
+                    _reject("Timed out retrieving image from URL")
+        except requests.RequestException:
+            _reject("Failed to retrieve image from URL")
+        body = bytes(body)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+    _count("fetches")
+    _count("bytes", len(body))
+    if (etag or last_modified) and len(body) <= IMAGE_FETCH_CACHE_MAX_ITEM_BYTES:
+        _cache.set(url, {"etag": etag, "last_modified": last_modified, "body": body})
+    return body
@@ -0,0 +1,129 @@
+import base64
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from helpers.fetch_helper import fetch_image
+
+# Preprocessing: largest image (in pixels) the detector sees, and how long pages are tiled.
+VISION_MAX_PIXELS = int(os.getenv('VISION_MAX_PIXELS', 8000000))
+# Only pages taller than VISION_TILE_ASPECT times their width are tiled; landscape screenshots never are.
+VISION_TILE_ASPECT = float(os.getenv('VISION_TILE_ASPECT', 2.0))
+VISION_TILE_OVERLAP = float(os.getenv('VISION_TILE_OVERLAP', 0.2))
+# Threads used to decode and analyze the images of one multi-image request side by side.
+IMAGE_BATCH_THREADS = int(os.getenv('IMAGE_BATCH_THREADS', 4))
+
+# Leading bytes of the formats we recognise, checked in order.
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'%PDF', 'pdf'),
+]
+
+# Formats decode_image can turn into a BGR array for the vision pipeline (GIF through Pillow).
+RASTER_FORMATS = ('png', 'jpeg', 'webp', 'bmp', 'tiff', 'gif')
+
+def sniff_format(buf):
+    """Detect the source format from the leading bytes of an encoded image."""
+    head = bytes(memoryview(buf)[:12])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, fmt in _SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    return None
+
+def read_image_bytes(image_data):
+    """Return the encoded bytes of a file upload, data URL, base64 string or http URL."""
+    if hasattr(image_data, 'read'):
+        return image_data.read()
+    if isinstance(image_data, str):
+        # Handle both direct URLs and data URLs
+        if image_data.startswith("http"):
+            return fetch_image(image_data)
+        # For data URLs, split the actual base64 content
+        parts = image_data.split('base64,')
+        image_str = parts[1] if len(parts) == 2 else image_data
+        return base64.b64decode(image_str)
+    raise Exception("Unsupported image input type")
+
+def _decode_gif(buf):
+    """First frame of a GIF as a BGR array; cv2.imdecode cannot read GIFs."""
+    from io import BytesIO
+    from PIL import Image
+    try:
+        with Image.open(BytesIO(bytes(buf))) as image:
+            rgb = np.asarray(image.convert('RGB'))
+    except Exception:
+        raise Exception("Failed to decode image")
+    return np.ascontiguousarray(rgb[:, :, ::-1])
+
+def decode_image(buf):
+    """Decode encoded image bytes into a contiguous BGR uint8 array without copying the input."""
+    import cv2
+    if sniff_format(buf) == 'gif':
+        return _decode_gif(buf)
+    encoded = np.frombuffer(memoryview(buf), dtype=np.uint8)
+    img = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    if img is None:
+        raise Exception("Failed to decode image")
+    return np.ascontiguousarray(img)
+
+def load_image_dir(directory):
+    """Decode every raster image in a directory, in name order (for benchmarks and validation)."""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'rb') as f:
+            buf = f.read()
+        if sniff_format(buf) in RASTER_FORMATS:
+            images.append(decode_image(buf))
+    if not images:
+        raise Exception(f"No sample images found in {directory}")
+    return images
+
+def load_image(image_data):
+    """Read and decode image input, returning (bgr_array_or_None, source_format, raw_bytes)."""
+    buf = read_image_bytes(image_data)
+    fmt = sniff_format(buf)
+    img = decode_image(buf) if fmt in RASTER_FORMATS else None
+    return img, fmt, buf
+
+def load_images(sources, max_workers=None):
+    """load_image over several inputs at once; reads and decodes run on a small thread pool."""
+    max_workers = max_workers or IMAGE_BATCH_THREADS
+    if len(sources) <= 1:
+        return [load_image(source) for source in sources]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sources))) as executor:
+        return list(executor.map(load_image, sources))
+
+def fit_pixel_budget(img, max_pixels=None):
+    """Downscale img so it holds at most max_pixels pixels; returns (image, scale applied)."""
+    max_pixels = VISION_MAX_PIXELS if max_pixels is None else max_pixels
+    height, width = img.shape[:2]
+    if not max_pixels or height * width <= max_pixels:
+        return img, 1.0
+    import cv2
+    scale = (max_pixels / float(height * width)) ** 0.5
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+def _spans(length, tile, overlap):
+    if length <= tile:
+        return [(0, length)]
+    stride = max(1, int(tile * (1 - overlap)))
+    starts = list(range(0, length - tile, stride)) + [length - tile]
+    return [(start, start + tile) for start in starts]
+
+def tile_boxes(shape, aspect=None, overlap=None):
+    """
+    Split a page taller than aspect times its width into overlapping full-width
+    (x_min, y_min, x_max, y_max) tiles of width by width * aspect. Wider images are one tile.
+    """
+    aspect = VISION_TILE_ASPECT if aspect is None else aspect
+    overlap = VISION_TILE_OVERLAP if overlap is None else overlap
+    height, width = shape[:2]
+    return [(0, y_min, width, y_max) for y_min, y_max in _spans(height, int(width * aspect), overlap)]
@@ -0,0 +1,103 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+# Micro-batching window for detector inference across concurrent requests.
+YOLO_BATCH_MAX_SIZE = int(os.getenv('YOLO_BATCH_MAX_SIZE', 8))
+YOLO_BATCH_MAX_WAIT_MS = float(os.getenv('YOLO_BATCH_MAX_WAIT_MS', 10))
+
+def yolo_batch_predictor(model):
+    """
+    Wrap an ultralytics model as predict_batch(images) -> one (N, 6) float32 array per image,
+    with rows [x_min, y_min, x_max, y_max, confidence, class_id].
+    """
+    def predict_batch(images):
+        results = model(list(images), verbose=False)
+        return [result.boxes.data.cpu().numpy().astype(np.float32) for result in results]
+    return predict_batch
+
+class InferenceScheduler:
+    """
+    Collect images submitted from request threads and run them through predict_batch as one
+    forward pass once max_batch_size images are waiting or the oldest has waited max_wait_ms.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=None, max_wait_ms=None):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size or YOLO_BATCH_MAX_SIZE)
+        self.max_wait = (YOLO_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._max_batch = 0
+        self._batch_sizes = {}
+        self._last_batch_ms = 0.0
+
+    def submit(self, image):
+        """Queue one image and return a Future resolving to its detections."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def predict(self, image, timeout=None):
+        """Queue one image and block until its detections are ready."""
+        return self.submit(image).result(timeout=timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "images": self._images,
+                "avg_batch_size": round(self._images / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size": self._max_batch,
+                "batch_size_counts": dict(self._batch_sizes),
+                "last_batch_ms": round(self._last_batch_ms, 2),
+            }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            try:
+                outputs = self.predict_batch([image for image, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
+            with self._stats_lock:
+                self._batches += 1
+                self._images += len(batch)
+                self._max_batch = max(self._max_batch, len(batch))
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._last_batch_ms = (time.perf_counter() - started) * 1000
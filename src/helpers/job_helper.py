@@ -0,0 +1,125 @@
+import datetime
+import os
+import threading
+import traceback
+from infra.db.models import ChatMessage, EditorMessage, GenerationJob
+from helpers.llm_helper import generate
+from helpers.metrics_helper import register_metrics
+
+# Generation jobs run on this many threads per web process; 0 leaves them to other processes.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+# Seconds a claimed job stays invisible; a worker that dies mid-job loses it after this.
+JOB_VISIBILITY_TIMEOUT = float(os.getenv('JOB_VISIBILITY_TIMEOUT', 180))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+# Base delay before a failed attempt is retried, doubled on every further attempt.
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', 5))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 0.5))
+
+_MESSAGE_TYPES = {'chat': ChatMessage, 'editor': EditorMessage}
+
+_workers = []
+_wake = threading.Event()
+_lock = threading.Lock()
+_counters = {"claimed": 0, "done": 0, "retried": 0, "failed": 0}
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+def _stats():
+    with _lock:
+        stats = {**_counters, "workers": len(_workers)}
+    try:
+        stats["pending"] = GenerationJob.objects(status='pending').count()
+        stats["running"] = GenerationJob.objects(status='running').count()
+    except Exception:
+        pass
+    return stats
+
+register_metrics('jobs', _stats)
+
+def enqueue_generation(message, kind, prompt, cache=False):
+    """
+    Queue generation of message.response with generate(prompt, kind, cache) and mark the message
+    pending. message is a saved ChatMessage or EditorMessage.
+    """
+    message_type = 'editor' if isinstance(message, EditorMessage) else 'chat'
+    message.update(set__status='pending', unset__error=True)
+    job = GenerationJob(kind=kind, prompt=prompt, message_type=message_type,
+                        message_id=str(message.id), cache=cache, max_attempts=JOB_MAX_ATTEMPTS)
+    job.save()
+    _wake.set()
+    return job
+
+def claim_job():
+    """
+    Atomically take the oldest visible job: pending, or running past its visibility timeout.
+    The claimed job is hidden from other workers for JOB_VISIBILITY_TIMEOUT seconds.
+    """
+    now = _now()
+    return GenerationJob.objects(status__in=('pending', 'running'), visible_at__lte=now).order_by('created_at').modify(
+        set__status='running',
+        set__visible_at=now + datetime.timedelta(seconds=JOB_VISIBILITY_TIMEOUT),
+        set__updated_at=now,
+        inc__attempts=1,
+        new=True
+    )
+
+def _fail(job, message_model, error):
+    job.update(set__status='failed', set__error=error, set__updated_at=_now())
+    message_model.objects(id=job.message_id).update_one(set__status='failed', set__error=error)
+    _count("failed")
+
+def run_job(job):
+    """Generate the reply for a claimed job and write it onto its message, retrying on failure."""
+    message_model = _MESSAGE_TYPES[job.message_type]
+    if job.attempts > job.max_attempts:
+        # Every attempt outlived its visibility timeout, e.g. the worker process kept dying.
+        _fail(job, message_model, "Generation timed out")
+        return
+    message_model.objects(id=job.message_id).update_one(set__status='running')
+    try:
+        response = generate(job.prompt, job.kind, cache=job.cache)
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        traceback.print_exc()
+        if job.attempts >= job.max_attempts:
+            _fail(job, message_model, error)
+        else:
+            delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.update(set__status='pending', set__error=error, set__updated_at=_now(),
+                       set__visible_at=_now() + datetime.timedelta(seconds=delay))
+            message_model.objects(id=job.message_id).update_one(set__status='pending')
+            _count("retried")
+        return
+    message_model.objects(id=job.message_id).update_one(
+        set__response=response, set__status='done', unset__error=True)
+    job.update(set__status='done', unset__error=True, set__updated_at=_now())
+    _count("done")
+
+def _work():
+    while True:
+        try:
+            job = claim_job()
+            if job is None:
+                _wake.wait(JOB_POLL_INTERVAL)
+                _wake.clear()
+                continue
+            _count("claimed")
+            run_job(job)
+        except Exception:
+            # Database hiccups must not kill the worker; an unfinished job becomes visible again.
+            traceback.print_exc()
+            _wake.wait(JOB_POLL_INTERVAL)
+
+def start_job_workers(count=None):
+    """Start the generation worker threads for this process."""
+    count = JOB_WORKERS if count is None else count
+    with _lock:
+        for index in range(len(_workers), count):
+            worker = threading.Thread(target=_work, name=f"generation-worker-{index}", daemon=True)
+            worker.start()
+            _workers.append(worker)
@@ -0,0 +1,121 @@
+import os
+import numpy as np
+from helpers.box_helper import box_area
+
+# Layout stage: group detections into a section/row/column tree for the prompt.
+ANALYSIS_LAYOUT = os.getenv('ANALYSIS_LAYOUT', 'true').lower() == 'true'
+# Same-class boxes overlapping by more than this IoU are treated as one element.
+LAYOUT_DUPLICATE_IOU = float(os.getenv('LAYOUT_DUPLICATE_IOU', 0.7))
+# Pixels two boxes may overlap and still be placed side by side or one above the other.
+LAYOUT_OVERLAP_TOLERANCE = float(os.getenv('LAYOUT_OVERLAP_TOLERANCE', 4))
+
+def _boxes(result_data):
+    """(N, 4) [x_min, y_min, x_max, y_max] array from result_data bbox centers and sizes."""
+    boxes = np.zeros((len(result_data), 4))
+    for i, entry in enumerate(result_data):
+        bbox = entry['bbox']
+        boxes[i] = (bbox['center_x'] - bbox['width'] / 2, bbox['center_y'] - bbox['height'] / 2,
+                    bbox['center_x'] + bbox['width'] / 2, bbox['center_y'] + bbox['height'] / 2)
+    return boxes
+
+class SweepIndex:
+    """
+    Spatial index over boxes sorted by x_min. Boxes overlapping box i horizontally are a
+    contiguous run of the sorted order found with one binary search, so pair queries cost
+    O(log n + k) rather than a scan of every box.
+    """
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.order = np.argsort(boxes[:, 0], kind='stable')
+        self.x_min = boxes[self.order, 0]
+        self.rank = np.empty(len(boxes), dtype=int)
+        self.rank[self.order] = np.arange(len(boxes))
+
+    def overlapping_after(self, i):
+        """Boxes later in x order than box i whose extent overlaps box i in both axes."""
+        start = self.rank[i] + 1
+        stop = np.searchsorted(self.x_min, self.boxes[i, 2], side='left')
+        candidates = self.order[start:stop]
+        box = self.boxes[i]
+        hits = (self.boxes[candidates, 1] < box[3]) & (self.boxes[candidates, 3] > box[1])
+        return candidates[hits]
+
+def suppress_duplicates(boxes, class_ids, confidences, iou_threshold=None):
+    """Indices kept after dropping the lower-confidence box of each same-class overlapping pair."""
+    iou_threshold = LAYOUT_DUPLICATE_IOU if iou_threshold is None else iou_threshold
+    index = SweepIndex(boxes)
+    areas = box_area(boxes)
+    dropped = np.zeros(len(boxes), dtype=bool)
+    for i in index.order:
+        others = index.overlapping_after(i)
+        others = others[class_ids[others] == class_ids[i]]
+        if not len(others):
+            continue
+        inter = (np.minimum(boxes[others, 2], boxes[i, 2]) - np.maximum(boxes[others, 0], boxes[i, 0])) * \
+                (np.minimum(boxes[others, 3], boxes[i, 3]) - np.maximum(boxes[others, 1], boxes[i, 1]))
+        iou = inter / np.maximum(areas[others] + areas[i] - inter, 1e-9)
+        for j in others[iou > iou_threshold]:
+            loser = j if confidences[j] <= confidences[i] else i
+            dropped[loser] = True
+    return np.where(~dropped)[0]
+
+def _split(indices, boxes, axis, tolerance):
+    """Sort-and-sweep indices into groups that do not overlap along axis (0 = x, 1 = y)."""
+    starts, ends = boxes[indices, axis], boxes[indices, axis + 2]
+    order = np.argsort(starts, kind='stable')
+    groups, current, reach = [], [indices[order[0]]], ends[order[0]]
+    for k in order[1:]:
+        if starts[k] >= reach - tolerance:
+            groups.append(current)
+            current, reach = [], ends[k]
+        current.append(indices[k])
+        reach = max(reach, ends[k])
+    groups.append(current)
+    return [np.array(group) for group in groups]
+
+def _bounds(indices, boxes):
+    return [int(round(v)) for v in (boxes[indices, 0].min(), boxes[indices, 1].min(),
+                                     boxes[indices, 2].max(), boxes[indices, 3].max())]
+
+def _cut(indices, boxes, axis, tolerance):
+    """Recursive XY-cut: stack along y as a column, split along x as a row, alternating axes."""
+    if len(indices) == 1:
+        return int(indices[0])
+    groups = _split(indices, boxes, axis, tolerance)
+    if len(groups) == 1:
+        axis = 1 - axis
+        groups = _split(indices, boxes, axis, tolerance)
+    if len(groups) == 1:
+        # Boxes overlap in both directions; keep them as an unordered cluster in reading order.
+        order = np.lexsort((boxes[indices, 0], boxes[indices, 1]))
+        return {"type": "group", "bbox": _bounds(indices, boxes), "children": [int(i) for i in indices[order]]}
+    children = [_cut(group, boxes, 1 - axis, tolerance) for group in groups]
+    return {"type": "column" if axis == 1 else "row", "bbox": _bounds(indices, boxes), "children": children}
+
+def build_layout(result_data, tolerance=None):
+    """
+    Deduplicate result_data and arrange it as a tree. The page is cut into vertically stacked
+    sections, each recursively split into rows (side by side) and columns (stacked) by
+    sort-and-sweep over box extents. Leaves are indexes into the returned elements list.
+    """
+    tolerance = LAYOUT_OVERLAP_TOLERANCE if tolerance is None else tolerance
+    if not result_data:
+        return {"elements": [], "layout": None}
+    boxes = _boxes(result_data)
+    class_ids = np.array([entry['class_id'] for entry in result_data])
+    confidences = np.array([entry['confidence'] for entry in result_data])
+    kept = suppress_duplicates(boxes, class_ids, confidences)
+    elements = [result_data[i] for i in kept]
+    boxes = boxes[kept]
+    indices = np.arange(len(elements))
+    sections = _split(indices, boxes, 1, tolerance)
+    layout = {
+        "type": "page",
+        "bbox": _bounds(indices, boxes),
+        "children": [
+            {"type": "section", "bbox": _bounds(group, boxes), "children": [_cut(group, boxes, 0, tolerance)]}
+            for group in sections
+        ],
+    }
+    return {"elements": elements, "layout": layout}
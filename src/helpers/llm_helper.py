@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from importlib.util import find_spec
+from helpers.cache_helper import TieredCache, digest
+from helpers.metrics_helper import register_metrics
+from helpers.llm_provider_helper import create_model, uses_gemini, validate_provider
+
+LLM_TEXT_MODEL = os.getenv('LLM_TEXT_MODEL', 'gemini-1.5-pro')
+LLM_CODE_MODEL = os.getenv('LLM_CODE_MODEL', 'gemini-2.0-flash')
+# Deterministic mode samples at temperature 0, which is what makes replies safe to cache.
+LLM_DETERMINISTIC = os.getenv('LLM_DETERMINISTIC', 'false').lower() == 'true'
+# Routes whose replies may be served from the response cache (deterministic mode only).
+LLM_CACHE_ROUTES = {r.strip() for r in os.getenv('LLM_CACHE_ROUTES', 'create,send,send-code,send-batch').split(',') if r.strip()}
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', 512))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 86400))
+
+_BASE_CONFIG = {
+    "temperature": 0 if LLM_DETERMINISTIC else 1,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+}
+
+# Kinds of generation the routes ask for: (model name, generation_config).
+PROFILES = {
+    'text': (LLM_TEXT_MODEL, {**_BASE_CONFIG, "response_mime_type": "text/plain"}),
+    'code': (LLM_CODE_MODEL, {**_BASE_CONFIG, "response_mime_type": "application/json"}),
+}
+
+# Replies keyed by model, generation_config and prompt (exact and whitespace/case normalized)
+_response_cache = TieredCache(
+    'llm_responses',
+    LLM_CACHE_SIZE,
+    mongo_enabled=os.getenv('LLM_CACHE_MONGO', 'false').lower() == 'true',
+    mongo_max_entries=int(os.getenv('LLM_CACHE_MONGO_MAX_ENTRIES', 10000)),
+    ttl=LLM_CACHE_TTL
+)
+_cache_counters = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+_genai = None
+_models = {}
+_lock = threading.Lock()
+_counters = {}
+_counters_lock = threading.Lock()
+
+def _stats():
+    with _counters_lock:
+        stats = {}
+        for kind, c in _counters.items():
+            stats[kind] = {
+                "calls": c["calls"],
+                "errors": c["errors"],
+                "avg_setup_ms": round(c["setup_seconds"] * 1000 / c["calls"], 3) if c["calls"] else 0.0,
+                "max_setup_ms": round(c["max_setup_seconds"] * 1000, 3),
+                "avg_latency_ms": round(c["seconds"] * 1000 / c["calls"], 1) if c["calls"] else 0.0,
+                "streams": c["streams"],
+                "cancelled": c["cancelled"],
+                "avg_first_chunk_ms": round(c["first_chunk_seconds"] * 1000 / c["streams"], 1) if c["streams"] else 0.0,
+            }
+        lookups = _cache_counters["hits"] + _cache_counters["misses"]
+        stats["cache"] = {
+            "deterministic": LLM_DETERMINISTIC,
+            "hits": _cache_counters["hits"],
+            "misses": _cache_counters["misses"],
+            "hit_rate": round(_cache_counters["hits"] / lookups, 4) if lookups else 0.0,
+            "saved_ms": round(_cache_counters["saved_seconds"] * 1000, 1),
+            **_response_cache.stats(),
+        }
+    with _lock:
+        stats["model_handles"] = len(_models)
+    return stats
+
+register_metrics('llm', _stats)
+
+def _record(kind, setup_seconds, seconds, failed, first_chunk_seconds=None, cancelled=False):
+    with _counters_lock:
+        c = _counters.setdefault(kind, {
+            "calls": 0, "errors": 0, "setup_seconds": 0.0, "max_setup_seconds": 0.0, "seconds": 0.0,
+            "streams": 0, "cancelled": 0, "first_chunk_seconds": 0.0,
+        })
+        c["calls"] += 1
+        c["errors"] += failed
+        c["setup_seconds"] += setup_seconds
+        c["max_setup_seconds"] = max(c["max_setup_seconds"], setup_seconds)
+        c["seconds"] += seconds
+        if first_chunk_seconds is not None:
+            c["streams"] += 1
+            c["first_chunk_seconds"] += first_chunk_seconds
+        c["cancelled"] += cancelled
+
+def cache_enabled(route):
+    """Whether route opted in to the response cache; replies are only cached in deterministic mode."""
+    return LLM_DETERMINISTIC and route in LLM_CACHE_ROUTES
+
+def normalize_prompt(prompt):
+    return ' '.join(prompt.split()).casefold()
+
+def _cache_keys(kind, prompt):
+    model_name, generation_config = PROFILES[kind]
+    profile = (model_name, repr(sorted(generation_config.items())))
+    return digest(*profile, 'exact', prompt), digest(*profile, 'normalized', normalize_prompt(prompt))
+
+def _cached_response(kind, prompt):
+    """Cached text for prompt, trying the exact prompt before its normalized form."""
+    for key in _cache_keys(kind, prompt):
+        entry = _response_cache.get(key)
+        if entry is not None:
+            with _counters_lock:
+                _cache_counters["hits"] += 1
+                _cache_counters["saved_seconds"] += entry["seconds"]
+            return entry["text"]
+    with _counters_lock:
+        _cache_counters["misses"] += 1
+    return None
+
+def _cache_response(kind, prompt, text, seconds):
+    entry = {"text": text, "seconds": seconds}
+    for key in _cache_keys(kind, prompt):
+        _response_cache.set(key, entry)
+
+def validate_llm_config():
+    """Fail at startup, not on the first chat request, when the LLM provider cannot be set up."""
+    validate_provider()
+    if uses_gemini() and not os.getenv('GOOGLE_API_KEY'):
+        raise Exception("Missing GOOGLE_API_KEY environment variable")
+    if uses_gemini() and find_spec('google.generativeai') is None:
+        raise Exception("google-generativeai is not installed")
+    for kind, (model_name, _) in PROFILES.items():
+        if not model_name:
+            raise Exception(f"No model configured for {kind} generation")
+
+def _client():
+    """The google.generativeai module, configured once per process; its gRPC channel is reused."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        api_key = os.getenv('GOOGLE_API_KEY')
+        if not api_key:
+            raise Exception("Missing GOOGLE_API_KEY environment variable")
+        genai.configure(api_key=api_key)
+        _genai = genai
+    return _genai
+
+def get_model(model_name, generation_config):
+    """Shared model handle of the configured provider for a (model name, generation_config) pair."""
+    key = (model_name, tuple(sorted(generation_config.items())))
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = create_model(model_name, generation_config, lambda: _client().GenerativeModel(
+                    model_name=model_name, generation_config=generation_config))
+                _models[key] = model
+    return model
+
+def generate(prompt, kind='text', cache=False):
+    """
+    Generate a reply to prompt with the model and generation_config of PROFILES[kind]
+    ('text' for chat replies, 'code' for JSON file maps) and return its text.
+    With cache (see cache_enabled), an earlier reply to the same prompt is reused.
+    """
+    if kind not in PROFILES:
+        raise Exception(f"Unknown generation kind: {kind}")
+    if cache:
+        text = _cached_response(kind, prompt)
+        if text is not None:
+            return text
+    started = time.perf_counter()
+    model = get_model(*PROFILES[kind])
+    setup_seconds = time.perf_counter() - started
+    failed = False
+    try:
+        text = model.generate_content(prompt).text
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _record(kind, setup_seconds, time.perf_counter() - started, failed)
+    if cache:
+        _cache_response(kind, prompt, text, time.perf_counter() - started)
+    return text
+
+def generate_stream(prompt, kind='text', cache=False):
+    """
+    generate() through the model's streaming API, yielding text chunks as they arrive.
+    Closing the generator early (e.g. the client went away) stops reading the stream, which
+    cancels the remaining generation. A cached reply is yielded as a single chunk.
+    """
+    if kind not in PROFILES:
+        raise Exception(f"Unknown generation kind: {kind}")
+    if cache:
+        text = _cached_response(kind, prompt)
+        if text is not None:
+            yield text
+            return
+    parts = []
+    started = time.perf_counter()
+    model = get_model(*PROFILES[kind])
+    setup_seconds = time.perf_counter() - started
+    first_chunk_seconds = None
+    failed = cancelled = False
+    try:
+        for chunk in model.generate_content(prompt, stream=True):
+            if first_chunk_seconds is None:
+                first_chunk_seconds = time.perf_counter() - started
+            parts.append(chunk.text)
+            yield chunk.text
+    except GeneratorExit:
+        cancelled = True
+        raise
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _record(kind, setup_seconds, time.perf_counter() - started, failed,
+                first_chunk_seconds or 0.0, cancelled)
+    if cache:
+        _cache_response(kind, prompt, ''.join(parts), time.perf_counter() - started)
@@ -0,0 +1,200 @@
+import json
+import os
+import random
+import threading
+import time
+from helpers.cache_helper import digest
+from helpers.metrics_helper import register_metrics
+
+# Backend behind llm_helper.generate(): 'gemini', 'fake' (local, no quota), 'record' (gemini, saving
+# every reply to LLM_REPLAY_DIR) or 'replay' (serve the saved replies).
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+# Fake replies take a log-normally distributed time: median LLM_FAKE_LATENCY_MS, spread
+# LLM_FAKE_LATENCY_SIGMA (0 for a fixed latency).
+LLM_FAKE_LATENCY_MS = float(os.getenv('LLM_FAKE_LATENCY_MS', 1500))
+LLM_FAKE_LATENCY_SIGMA = float(os.getenv('LLM_FAKE_LATENCY_SIGMA', 0.5))
+LLM_FAKE_OUTPUT_CHARS = int(os.getenv('LLM_FAKE_OUTPUT_CHARS', 4000))
+LLM_FAKE_STREAM_CHUNKS = int(os.getenv('LLM_FAKE_STREAM_CHUNKS', 10))
+LLM_REPLAY_DIR = os.getenv('LLM_REPLAY_DIR', 'llm_recordings')
+# Sleep for the recorded generation time when replaying, so timings stay realistic.
+LLM_REPLAY_LATENCY = os.getenv('LLM_REPLAY_LATENCY', 'true').lower() == 'true'
+# A prompt with no recording fails, or gets a fake reply with LLM_REPLAY_MISS=fake.
+LLM_REPLAY_MISS = os.getenv('LLM_REPLAY_MISS', 'error')
+
+PROVIDERS = ('gemini', 'fake', 'record', 'replay')
+
+_WORDS = ("the page layout button header card section color spacing grid hero image form input "
+          "navigation footer responsive design primary secondary text align center margin").split()
+
+_lock = threading.Lock()
+_counters = {"fake": 0, "recorded": 0, "replayed": 0, "replay_misses": 0}
+_latency = random.Random(os.getenv('LLM_FAKE_SEED') or None)
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+def _stats():
+    with _lock:
+        return {"provider": LLM_PROVIDER, **_counters}
+
+register_metrics('llm_provider', _stats)
+
+class _Reply:
+    """The part of a google.generativeai response (or stream chunk) that llm_helper reads."""
+
+    def __init__(self, text):
+        self.text = text
+
+def _chunks(text, count):
+    size = max(1, -(-len(text) // max(1, count)))
+    return [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+def _replay(chunks, seconds, stream):
+    """A reply made of chunks that takes seconds, as one response or as a stream."""
+    if not stream:
+        time.sleep(seconds)
+        return _Reply(''.join(chunks))
+
+    def replies():
+        for chunk in chunks:
+            time.sleep(seconds / len(chunks))
+            yield _Reply(chunk)
+    return replies()
+
+class FakeModel:
+    """
+    Stand-in for a GenerativeModel that makes no network calls. Replies are derived from the prompt,
+    so a prompt always gets the same reply: JSON file maps for application/json models, prose
+    otherwise, about LLM_FAKE_OUTPUT_CHARS long. Patch prompts (see patch_helper) get a small patch
+    that applies to the files they carry, about a tenth of that size.
+    """
+
+    def __init__(self, model_name, generation_config):
+        self.model_name = model_name
+        self.json = generation_config.get('response_mime_type') == 'application/json'
+
+    def _words(self, rng, chars):
+        words = []
+        length = 0
+        while length < chars:
+            words.append(rng.choice(_WORDS))
+            length += len(words[-1]) + 1
+        return ' '.join(words)
+
+    def _patch(self, rng, prompt):
+        """An edit appending a comment to one of the files in a patch prompt."""
+        _, found, rest = prompt.partition("Current files:\n")
+        try:
+            files = json.loads(rest.partition("\n")[0]) if found else {}
+        except ValueError:
+            files = {}
+        paths = sorted(path for path, value in files.items()
+                       if isinstance(value, str) or isinstance(value, dict) and isinstance(value.get('code'), str))
+        comment = f"\n/* {self._words(rng, LLM_FAKE_OUTPUT_CHARS // 10)} */\n"
+        if not paths:
+            return json.dumps({"edits": [{"op": "write", "path": "/fake.js", "content": comment}]})
+        return json.dumps({"edits": [{"op": "insert", "path": rng.choice(paths), "content": comment}]})
+
+    def _text(self, prompt):
+        from helpers.patch_helper import PATCH_INSTRUCTIONS
+        rng = random.Random(digest(self.model_name, prompt))
+        if self.json and prompt.startswith(PATCH_INSTRUCTIONS):
+            return self._patch(rng, prompt[len(PATCH_INSTRUCTIONS):])
+        text = self._words(rng, LLM_FAKE_OUTPUT_CHARS)
+        if not self.json:
+            return text
+        half = len(text) // 2
+        return json.dumps({
+            "/App.js": f"export default function App() {{\n  return <main>{text[:half]}</main>;\n}}\n",
+            "/styles.css": f"/* {text[half:]} */\nmain {{ margin: 0 auto; }}\n",
+        })
+
+    def generate_content(self, prompt, stream=False):
+        _count("fake")
+        seconds = LLM_FAKE_LATENCY_MS / 1000
+        if LLM_FAKE_LATENCY_SIGMA > 0:
+            with _lock:
+                seconds *= _latency.lognormvariate(0, LLM_FAKE_LATENCY_SIGMA)
+        return _replay(_chunks(self._text(prompt), LLM_FAKE_STREAM_CHUNKS), seconds, stream)
+
+def _recording_path(model_name, generation_config, prompt):
+    key = digest(model_name, repr(sorted(generation_config.items())), prompt)
+    return os.path.join(LLM_REPLAY_DIR, f"{key}.json")
+
+class RecordingModel:
+    """Wraps a real GenerativeModel and saves every completed reply under LLM_REPLAY_DIR."""
+
+    def __init__(self, model, model_name, generation_config):
+        self.model = model
+        self.model_name = model_name
+        self.generation_config = generation_config
+
+    def _save(self, prompt, chunks, seconds):
+        path = _recording_path(self.model_name, self.generation_config, prompt)
+        os.makedirs(LLM_REPLAY_DIR, exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model_name, "prompt": prompt, "chunks": chunks, "seconds": seconds}, f)
+        os.replace(temp, path)
+        _count("recorded")
+
+    def generate_content(self, prompt, stream=False):
+        started = time.perf_counter()
+        if not stream:
+            response = self.model.generate_content(prompt)
+            self._save(prompt, [response.text], time.perf_counter() - started)
+            return response
+
+        def replies():
+            chunks = []
+            for chunk in self.model.generate_content(prompt, stream=True):
+                chunks.append(chunk.text)
+                yield chunk
+            # Only streams read to the end are saved; a cancelled one would replay truncated.
+            self._save(prompt, chunks, time.perf_counter() - started)
+        return replies()
+
+class ReplayModel:
+    """Serves replies saved by RecordingModel for the same model, generation config and prompt."""
+
+    def __init__(self, model_name, generation_config):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.fake = FakeModel(model_name, generation_config)
+
+    def generate_content(self, prompt, stream=False):
+        try:
+            with open(_recording_path(self.model_name, self.generation_config, prompt), encoding='utf-8') as f:
+                recording = json.load(f)
+        except FileNotFoundError:
+            _count("replay_misses")
+            if LLM_REPLAY_MISS == 'fake':
+                return self.fake.generate_content(prompt, stream)
+            raise Exception(f"No recorded {self.model_name} response for this prompt in {LLM_REPLAY_DIR}")
+        _count("replayed")
+        seconds = recording["seconds"] if LLM_REPLAY_LATENCY else 0
+        return _replay(recording["chunks"], seconds, stream)
+
+def validate_provider():
+    """Fail at startup when LLM_PROVIDER is unknown or has no recordings to replay."""
+    if LLM_PROVIDER not in PROVIDERS:
+        raise Exception(f"Unknown LLM provider: {LLM_PROVIDER}")
+    if LLM_PROVIDER == 'replay' and not os.path.isdir(LLM_REPLAY_DIR):
+        raise Exception(f"LLM_REPLAY_DIR {LLM_REPLAY_DIR} does not exist; record responses first")
+
+def uses_gemini():
+    return LLM_PROVIDER in ('gemini', 'record')
+
+def create_model(model_name, generation_config, gemini_model):
+    """
+    Model handle for LLM_PROVIDER. gemini_model() builds the real GenerativeModel and is only
+    called by the providers that need one.
+    """
+    if LLM_PROVIDER == 'fake':
+        return FakeModel(model_name, generation_config)
+    if LLM_PROVIDER == 'replay':
+        return ReplayModel(model_name, generation_config)
+    if LLM_PROVIDER == 'record':
+        return RecordingModel(gemini_model(), model_name, generation_config)
+    return gemini_model()
@@ -0,0 +1,15 @@
+import threading
+
+_sources = {}
+_lock = threading.Lock()
+
+def register_metrics(name, collect):
+    """Register a zero-argument callable whose dict result is reported under name."""
+    with _lock:
+        _sources[name] = collect
+
+def collect_metrics():
+    """Snapshot every registered metrics source."""
+    with _lock:
+        sources = dict(_sources)
+    return {name: collect() for name, collect in sources.items()}
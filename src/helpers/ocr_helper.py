@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+import numpy as np
+from helpers.cache_helper import LRUCache, digest
+from helpers.metrics_helper import register_metrics
+
+OCR_LANGUAGES = [lang.strip() for lang in os.getenv('OCR_LANGUAGES', 'en').split(',') if lang.strip()]
+# Wall-clock OCR allowance per image; boxes not reached in time get no text.
+OCR_TIME_BUDGET_MS = float(os.getenv('OCR_TIME_BUDGET_MS', 1500))
+# Crops recognised per easyocr call; the budget is checked between calls. The CPU reader works
+# through a call one crop at a time, so a small batch keeps the budget overrun to a few crops.
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', 4))
+OCR_CACHE_SIZE = int(os.getenv('OCR_CACHE_SIZE', 2048))
+
+TEXT_CLASSES = ('button', 'heading', 'label', 'link', 'text', 'field')
+
+_reader = None
+_reader_lock = threading.Lock()
+_cache = LRUCache(OCR_CACHE_SIZE)
+_counters = {"recognized": 0, "skipped_budget": 0}
+_counters_lock = threading.Lock()
+
+def _stats():
+    with _counters_lock:
+        return {**_counters, "cache": _cache.stats()}
+
+register_metrics('ocr', _stats)
+
+def get_reader():
+    """The process-wide easyocr.Reader, created on first use."""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                import easyocr
+                _reader = easyocr.Reader(OCR_LANGUAGES, gpu=False, verbose=False)
+    return _reader
+
+def recognize_text(gray, boxes, budget_ms=None):
+    """
+    Read the text in each (x_min, y_min, x_max, y_max) box of a grayscale image, or None.
+    Cached crops are answered without recognition; the rest go to easyocr in batches of
+    OCR_BATCH_SIZE until budget_ms has elapsed, after which remaining boxes are skipped.
+    """
+    budget_ms = OCR_TIME_BUDGET_MS if budget_ms is None else budget_ms
+    deadline = time.monotonic() + budget_ms / 1000.0
+    height, width = gray.shape[:2]
+    texts = [None] * len(boxes)
+    pending = []
+    for index, (x_min, y_min, x_max, y_max) in enumerate(boxes):
+        # Clip to integer pixels exactly as easyocr does, so its output boxes map back to ours.
+        x_min, y_min = max(0, int(x_min)), max(0, int(y_min))
+        x_max, y_max = min(int(x_max), width), min(int(y_max), height)
+        if x_max - x_min < 2 or y_max - y_min < 2:
+            continue
+        crop = np.ascontiguousarray(gray[y_min:y_max, x_min:x_max])
+        key = digest(str(crop.shape), crop)
+        cached = _cache.get(key)
+        if cached is not None:
+            texts[index] = cached
+        else:
+            pending.append((index, key, [x_min, x_max, y_min, y_max]))
+
+    recognized = processed = 0
+    for start in range(0, len(pending), max(1, OCR_BATCH_SIZE)):
+        if time.monotonic() > deadline:
+            break
+        chunk = pending[start:start + max(1, OCR_BATCH_SIZE)]
+        owners = {}
+        for index, key, (x_min, x_max, y_min, y_max) in chunk:
+            owners.setdefault((x_min, y_min, x_max, y_max), []).append((index, key))
+        results = get_reader().recognize(
+            gray, horizontal_list=[box for _, _, box in chunk], free_list=[],
+            batch_size=len(chunk), detail=1
+        )
+        for points, text, _ in results:
+            (x_min, y_min), _, (x_max, y_max), _ = points
+            matches = owners.get((int(x_min), int(y_min), int(x_max), int(y_max)))
+            if matches:
+                index, key = matches.pop(0)
+                texts[index] = text
+                _cache.set(key, text)
+                recognized += 1
+        # Boxes easyocr returned nothing for are blank, not unprocessed.
+        for matches in owners.values():
+            for index, key in matches:
+                texts[index] = ''
+                _cache.set(key, '')
+        processed += len(chunk)
+
+    with _counters_lock:
+        _counters["recognized"] += recognized
+        _counters["skipped_budget"] += len(pending) - processed
+    return texts
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+from infra.db.models import Chat, EditorMessage
+from helpers.analysis_helper import estimate_tokens
+from helpers.llm_helper import generate
+from helpers.metrics_helper import register_metrics
+
+# /send-code asks for a patch against the latest project files instead of the whole project;
+# a request can override this with its incremental field.
+CODE_INCREMENTAL = os.getenv('CODE_INCREMENTAL', 'true').lower() == 'true'
+# Larger projects are regenerated in full rather than sent along with the prompt.
+CODE_PATCH_MAX_FILES_BYTES = int(os.getenv('CODE_PATCH_MAX_FILES_BYTES', 400 * 1024))
+
+PATCH_INSTRUCTIONS = (
+    "You are editing an existing website project. Its current files are given below as a JSON object "
+    "mapping file paths to their code. Do not return the whole project. Answer with a JSON object "
+    "{\"edits\": [...]} listing only the changes needed, applied in order, each one of:\n"
+    "{\"op\": \"replace\", \"path\": ..., \"find\": ..., \"content\": ...} replaces the exact text find, "
+    "which must occur once in the file, with content;\n"
+    "{\"op\": \"insert\", \"path\": ..., \"after\": ..., \"content\": ...} inserts content right after the "
+    "exact text after, which must occur once (without after, content is appended to the file);\n"
+    "{\"op\": \"delete\", \"path\": ..., \"find\": ...} removes the exact text find, which must occur once "
+    "(without find, the whole file is deleted);\n"
+    "{\"op\": \"write\", \"path\": ..., \"content\": ...} creates the file or replaces all of its code.\n"
+    "Keep find and after short but unique, copied character for character from the current code.\n\n"
+)
+
+class PatchError(Exception):
+    """The model's patch is malformed or does not apply to the current files."""
+
+_lock = threading.Lock()
+_counters = {"patches": 0, "fallbacks": 0, "edits": 0, "output_tokens": 0, "full_output_tokens": 0}
+
+def _stats():
+    with _lock:
+        attempts = _counters["patches"] + _counters["fallbacks"]
+        return {
+            **_counters,
+            "incremental": CODE_INCREMENTAL,
+            "fallback_rate": round(_counters["fallbacks"] / attempts, 4) if attempts else 0.0,
+            "saved_output_tokens": _counters["full_output_tokens"] - _counters["output_tokens"],
+        }
+
+register_metrics('code_patch', _stats)
+
+def incremental_enabled(data):
+    """Patch mode unless disabled by CODE_INCREMENTAL or the request body's incremental field."""
+    value = data.get('incremental')
+    if value is None or value == '':
+        return CODE_INCREMENTAL
+    return str(value).lower() in ('true', '1')
+
+def latest_snapshot(chat):
+    """
+    The newest finished EditorMessage of chat whose response is a JSON file map, with that map,
+    as (message, files); (None, None) when there is none. Only message ids are read from the chat.
+    """
+    doc = Chat.objects(id=chat.id).no_dereference().only('editor_messages').first()
+    ids = [getattr(ref, 'id', ref) for ref in (doc.editor_messages if doc else None) or []][-5:]
+    found = {m.id: m for m in EditorMessage.objects(id__in=ids)} if ids else {}
+    for message_id in reversed(ids):
+        message = found.get(message_id)
+        if not message or message.status != 'done' or not message.response:
+            continue
+        try:
+            files = json.loads(message.response)
+        except ValueError:
+            continue
+        if isinstance(files, dict) and files:
+            return message, files
+    return None, None
+
+def _code(files, path):
+    if path not in files:
+        raise PatchError(f"{path} does not exist")
+    value = files[path]
+    code = value.get('code') if isinstance(value, dict) else value
+    if not isinstance(code, str):
+        raise PatchError(f"{path} has no code to edit")
+    return code
+
+def _set_code(files, path, code, wrapped):
+    """Store code at path, keeping {"code": ...} values (wrapped) for files the project did not have."""
+    value = files.get(path)
+    if isinstance(value, dict):
+        files[path] = {**value, 'code': code}
+    else:
+        files[path] = {'code': code} if value is None and wrapped else code
+
+def _locate(code, text, path, name):
+    if not isinstance(text, str) or not text:
+        raise PatchError(f"{name} for {path} must be non-empty text")
+    count = code.count(text)
+    if count != 1:
+        raise PatchError(f"{name} text matches {count} times in {path}")
+    return code.index(text)
+
+def apply_patch(files, patch):
+    """
+    Apply patch ({"edits": [...]}, see PATCH_INSTRUCTIONS) to a file map and return the new map;
+    files itself is left unchanged. Raises PatchError on the first edit that does not apply.
+    """
+    edits = patch.get('edits') if isinstance(patch, dict) else None
+    if not isinstance(edits, list) or not edits:
+        raise PatchError("Patch has no edits")
+    # Projects store each file either as its code or as {"code": ...}; new files follow suit.
+    wrapped = any(isinstance(value, dict) for value in files.values())
+    files = dict(files)
+    for edit in edits:
+        if not isinstance(edit, dict) or not isinstance(edit.get('path'), str) or not edit['path']:
+            raise PatchError(f"Invalid edit: {edit!r:.80}")
+        op, path = edit.get('op'), edit['path']
+        content = edit.get('content')
+        if op in ('replace', 'insert', 'write') and not isinstance(content, str):
+            raise PatchError(f"{op} for {path} needs text content")
+        if op == 'write':
+            _set_code(files, path, content, wrapped)
+        elif op == 'replace':
+            code = _code(files, path)
+            start = _locate(code, edit.get('find'), path, 'find')
+            _set_code(files, path, code[:start] + content + code[start + len(edit['find']):], wrapped)
+        elif op == 'insert':
+            if not edit.get('after'):
+                _set_code(files, path, (_code(files, path) if path in files else '') + content, wrapped)
+                continue
+            code = _code(files, path)
+            end = _locate(code, edit['after'], path, 'after') + len(edit['after'])
+            _set_code(files, path, code[:end] + content + code[end:], wrapped)
+        elif op == 'delete':
+            if not edit.get('find'):
+                if path not in files:
+                    raise PatchError(f"{path} does not exist")
+                del files[path]
+                continue
+            code = _code(files, path)
+            start = _locate(code, edit['find'], path, 'find')
+            _set_code(files, path, code[:start] + code[start + len(edit['find']):], wrapped)
+        else:
+            raise PatchError(f"Unknown edit op {op!r} for {path}")
+    return files
+
+def generate_patch(files, full_prompt, cache=False):
+    """
+    Ask the code model for a patch against files for full_prompt and apply it.
+    Returns (patch_text, new_files); raises PatchError when the reply is not a patch that applies.
+    """
+    current = json.dumps(files)
+    if len(current.encode()) > CODE_PATCH_MAX_FILES_BYTES:
+        raise PatchError("Project is too large to send for patching")
+    text = generate(f"{PATCH_INSTRUCTIONS}Current files:\n{current}\n\n{full_prompt}", 'code', cache=cache)
+    try:
+        patch = json.loads(text)
+    except ValueError:
+        raise PatchError("Reply is not valid JSON")
+    new_files = apply_patch(files, patch)
+    with _lock:
+        _counters["patches"] += 1
+        _counters["edits"] += len(patch['edits'])
+        _counters["output_tokens"] += estimate_tokens(text)
+        _counters["full_output_tokens"] += estimate_tokens(json.dumps(new_files))
+    return text, new_files
+
+def record_fallback():
+    with _lock:
+        _counters["fallbacks"] += 1
@@ -0,0 +1,60 @@
+import os
+from helpers.image_helper import VISION_MAX_PIXELS
+
+# Resolution PDF pages are rasterized at before detection.
+PDF_RENDER_DPI = float(os.getenv('PDF_RENDER_DPI', 144))
+# Most pages analyzed from one document; a page range picks which ones.
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', 20))
+
+def parse_page_range(value, page_count):
+    """
+    Zero-based page indexes for a 1-based range string such as "1-3,7" (all pages when empty),
+    in document order and capped at PDF_MAX_PAGES.
+    """
+    if not value:
+        return list(range(min(page_count, PDF_MAX_PAGES)))
+    pages = set()
+    for part in str(value).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise Exception(f"Invalid page range: {value}")
+        if first < 1 or last < first or last > page_count:
+            raise Exception(f"Page range {part} is outside the document's {page_count} pages")
+        pages.update(range(first - 1, last))
+    if len(pages) > PDF_MAX_PAGES:
+        raise Exception(f"At most {PDF_MAX_PAGES} pages can be analyzed at once")
+    return sorted(pages)
+
+def iter_pdf_pages(buf, pages=None, dpi=None):
+    """
+    Rasterize the selected pages of a PDF lazily, yielding (page_number, bgr_array) one page at a
+    time so only the current page is held in memory. Pages that would exceed VISION_MAX_PIXELS at
+    dpi are rendered at a lower resolution instead of being downscaled afterwards.
+    """
+    import cv2
+    import pymupdf
+    import numpy as np
+    dpi = PDF_RENDER_DPI if dpi is None else dpi
+    try:
+        document = pymupdf.open(stream=bytes(buf), filetype='pdf')
+    except Exception:
+        raise Exception("Failed to open PDF")
+    with document:
+        for index in parse_page_range(pages, document.page_count):
+            page = document.load_page(index)
+            zoom = dpi / 72.0
+            area = page.rect.width * page.rect.height * zoom * zoom
+            if VISION_MAX_PIXELS and area > VISION_MAX_PIXELS:
+                zoom *= (VISION_MAX_PIXELS / area) ** 0.5
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), colorspace=pymupdf.csRGB, alpha=False)
+            rgb = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)
+            rgb = rgb[:, :pixmap.width * 3].reshape(pixmap.height, pixmap.width, 3)
+            img = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+            del rgb, pixmap, page
+            yield index + 1, img
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from helpers.cache_helper import MongoCache
+
+# Reuse the detections of a near-duplicate upload (cursor, timestamp, re-compression) when its
+# perceptual hash is within SIMILARITY_MAX_DISTANCE bits of one seen before at the same size.
+# Opt-in: pages with different content can hash alike, so only the boxes are reused and the
+# per-box features (text, colors, ...) are always recomputed on the new image.
+SIMILARITY_CACHE = os.getenv('SIMILARITY_CACHE', 'false').lower() == 'true'
+SIMILARITY_MAX_DISTANCE = int(os.getenv('SIMILARITY_MAX_DISTANCE', 4))
+SIMILARITY_CACHE_SIZE = int(os.getenv('SIMILARITY_CACHE_SIZE', 4096))
+
+def phash(img):
+    """64-bit DCT perceptual hash of a BGR image: low frequencies of a 32x32 thumbnail vs their median."""
+    import cv2
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumb)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance. A search only descends into
+    children whose edge distance is within max_distance of the query's distance to the node,
+    so lookups touch a small part of the tree instead of every hash.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value):
+        if self.root is None:
+            self.root = (value, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """(distance, hash) pairs within max_distance of value."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, node_value))
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+class SimilarityIndex:
+    """
+    Perceptual hashes of analyzed images, grouped by bucket (model version, features and image
+    size), each mapped to the analysis cache key of that image. Bounded to max_size hashes with
+    least-recently-used eviction; evicted hashes stay in their BK-tree until it is rebuilt.
+    With mongo_enabled the index is persisted in cache_entries and reloaded on first use.
+    """
+
+    def __init__(self, namespace, max_size=None, max_distance=None, mongo_enabled=False):
+        self.max_size = SIMILARITY_CACHE_SIZE if max_size is None else max_size
+        self.max_distance = SIMILARITY_MAX_DISTANCE if max_distance is None else max_distance
+        self.mongo = MongoCache(namespace, self.max_size) if mongo_enabled else None
+        self._entries = OrderedDict()
+        self._trees = {}
+        self._stale = 0
+        self._loaded = self.mongo is None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self._lookup_seconds = 0.0
+        self._max_lookup_seconds = 0.0
+
+    def _load(self):
+        for key, cache_key in reversed(self.mongo.recent(self.max_size)):
+            bucket, _, value = key.rpartition(':')
+            self._insert(bucket, int(value, 16), cache_key)
+        self._loaded = True
+
+    def _insert(self, bucket, value, cache_key):
+        self._entries[(bucket, value)] = cache_key
+        self._entries.move_to_end((bucket, value))
+        self._trees.setdefault(bucket, BKTree()).add(value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stale += 1
+        if self._stale > self.max_size:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._trees = {}
+        for bucket, value in self._entries:
+            self._trees.setdefault(bucket, BKTree()).add(value)
+        self._stale = 0
+
+    def find(self, bucket, value):
+        """Cache key of the closest indexed image in bucket within max_distance, or None."""
+        started = time.perf_counter()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            matches = self._trees[bucket].search(value, self.max_distance) if bucket in self._trees else []
+            cache_key = None
+            for _, match in sorted(matches):
+                cache_key = self._entries.get((bucket, match))
+                if cache_key is not None:
+                    self._entries.move_to_end((bucket, match))
+                    break
+            elapsed = time.perf_counter() - started
+            self.lookups += 1
+            self.hits += cache_key is not None
+            self._lookup_seconds += elapsed
+            self._max_lookup_seconds = max(self._max_lookup_seconds, elapsed)
+        return cache_key
+
+    def add(self, bucket, value, cache_key):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._insert(bucket, value, cache_key)
+        if self.mongo is not None:
+            self.mongo.set(f"{bucket}:{value:016x}", cache_key)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "max_distance": self.max_distance,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "avg_lookup_ms": round(self._lookup_seconds * 1000 / self.lookups, 3) if self.lookups else 0.0,
+                "max_lookup_ms": round(self._max_lookup_seconds * 1000, 3),
+            }
+        if self.mongo is not None:
+            stats["mongo"] = self.mongo.stats()
+        return stats
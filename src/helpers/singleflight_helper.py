@@ -0,0 +1,133 @@
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from mongoengine.errors import NotUniqueError
+from infra.db.models import GenerationLease
+from helpers.metrics_helper import register_metrics
+
+# How long a leader may run before other processes treat its lease as abandoned and take over.
+SINGLE_FLIGHT_LEASE_SECONDS = float(os.getenv('SINGLE_FLIGHT_LEASE_SECONDS', 180))
+# How long a finished result stays readable for duplicates that arrive just after it.
+SINGLE_FLIGHT_LINGER_SECONDS = float(os.getenv('SINGLE_FLIGHT_LINGER_SECONDS', 10))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv('SINGLE_FLIGHT_POLL_INTERVAL', 0.25))
+
+_OWNER = uuid.uuid4().hex
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_lock = threading.Lock()
+_counters = {"leaders": 0, "local_joins": 0, "remote_joins": 0, "takeovers": 0, "lease_errors": 0}
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+def _stats():
+    with _lock:
+        return {**_counters, "in_flight": len(_flights)}
+
+register_metrics('single_flight', _stats)
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _expired(lease):
+    return lease.expires_at.replace(tzinfo=datetime.timezone.utc) <= _now()
+
+def _acquire(key):
+    """Take the Mongo lease for key; returns True when this process should run the call."""
+    try:
+        GenerationLease(key=key, owner=_OWNER,
+                        expires_at=_now() + datetime.timedelta(seconds=SINGLE_FLIGHT_LEASE_SECONDS)).save(force_insert=True)
+        return True
+    except NotUniqueError:
+        return False
+
+def _await_remote(key):
+    """
+    Wait for another process's lease on key to finish and return it. Returns None when this
+    process has taken the key over instead: the lease is gone, its leader abandoned it, or its
+    result is older than SINGLE_FLIGHT_LINGER_SECONDS (the TTL monitor only runs every minute).
+    """
+    while True:
+        lease = GenerationLease.objects(key=key).first()
+        if lease is None or _expired(lease):
+            if lease is not None:
+                GenerationLease.objects(id=lease.id, owner=lease.owner, status=lease.status).delete()
+            if _acquire(key):
+                if lease is not None and lease.status == 'running':
+                    _count("takeovers")
+                return None
+            continue
+        if lease.status != 'running':
+            return lease
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+def _finish(key, result=None, error=None):
+    try:
+        GenerationLease.objects(key=key, owner=_OWNER).update_one(
+            set__status='failed' if error else 'done',
+            set__result=None if error else json.dumps(result),
+            set__error=error,
+            set__expires_at=_now() + datetime.timedelta(seconds=SINGLE_FLIGHT_LINGER_SECONDS)
+        )
+    except Exception:
+        _count("lease_errors")
+
+def _lead(key, fn):
+    """Run fn under the cross-process lease for key, or join the process that holds it."""
+    try:
+        lease = None if _acquire(key) else _await_remote(key)
+    except Exception:
+        _count("lease_errors")
+        return fn()
+    if lease is not None:
+        _count("remote_joins")
+        if lease.status == 'failed':
+            raise Exception(lease.error)
+        return json.loads(lease.result)
+    _count("leaders")
+    try:
+        result = fn()
+    except Exception as e:
+        _finish(key, error=str(e) or e.__class__.__name__)
+        raise
+    _finish(key, result=result)
+    return result
+
+def single_flight(key, fn):
+    """
+    Run fn() once for concurrent calls with the same key and hand every caller its result.
+    Callers in this process wait on the in-flight call; other processes coordinate through a
+    lease document in generation_leases and poll it for the result, which must be JSON
+    serializable. If the lease store is unavailable, fn runs without coordination.
+    """
+    with _lock:
+        flight = _flights.get(key)
+        joined = flight is not None
+        if not joined:
+            flight = _flights[key] = _Flight()
+    if joined:
+        _count("local_joins")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = _lead(key, fn)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.done.set()
@@ -0,0 +1,249 @@
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+from helpers.cache_helper import digest
+from helpers.box_helper import filter_detections, merge_tile_detections
+from helpers.feature_helper import extract_features, parse_features
+from helpers.ocr_helper import get_reader
+from helpers.image_helper import IMAGE_BATCH_THREADS, fit_pixel_budget, tile_boxes
+from helpers.detector_helper import load_detector, detector_version
+from helpers.inference_helper import InferenceScheduler, yolo_batch_predictor
+from helpers.metrics_helper import register_metrics
+from helpers.vision_pool_helper import VisionPool, VISION_POOL_SIZE
+
+# Load and warm models in a background thread at startup instead of on the first request.
+VISION_WARMUP = os.getenv('VISION_WARMUP', 'true').lower() == 'true'
+# IoU above which same-class detections from overlapping tiles are treated as one element.
+VISION_TILE_MERGE_IOU = float(os.getenv('VISION_TILE_MERGE_IOU', 0.5))
+
+# Post-processing before any crop work: boxes below their class's confidence floor, same-class
+# overlaps above the IoU and same-class boxes mostly inside a larger one are dropped.
+DETECTION_MIN_CONFIDENCE = float(os.getenv('DETECTION_MIN_CONFIDENCE', 0.25))
+# Per-class overrides of the floor, e.g. "text=0.4,image=0.35".
+DETECTION_CLASS_CONFIDENCE = os.getenv('DETECTION_CLASS_CONFIDENCE', '')
+DETECTION_NMS_IOU = float(os.getenv('DETECTION_NMS_IOU', 0.5))
+DETECTION_CONTAINMENT = float(os.getenv('DETECTION_CONTAINMENT', 0.9))
+
+class_names = ['button', 'field', 'heading', 'iframe', 'image', 'label', 'link', 'text']
+
+def class_confidence_floors(value=None):
+    """Per-class confidence thresholds, indexed by class id, from DETECTION_CLASS_CONFIDENCE."""
+    value = DETECTION_CLASS_CONFIDENCE if value is None else value
+    floors = np.full(len(class_names), DETECTION_MIN_CONFIDENCE, dtype=np.float32)
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, _, threshold = item.partition('=')
+        if name.strip() not in class_names:
+            raise Exception(f"Unknown class in DETECTION_CLASS_CONFIDENCE: {name.strip()}")
+        floors[class_names.index(name.strip())] = float(threshold)
+    return floors
+
+_confidence_floors = class_confidence_floors()
+_filter_counts = {"images": 0, "boxes_in": 0, "boxes_kept": 0, "dropped_confidence": 0, "dropped_overlap": 0, "dropped_contained": 0}
+_filter_lock = threading.Lock()
+
+def _filter_stats():
+    with _filter_lock:
+        return dict(_filter_counts)
+
+register_metrics('detection_filter', _filter_stats)
+
+def _record_filter(counts):
+    with _filter_lock:
+        _filter_counts["images"] += 1
+        _filter_counts["boxes_in"] += counts["boxes_in"]
+        _filter_counts["boxes_kept"] += counts["boxes_kept"]
+        for step in ("confidence", "overlap", "contained"):
+            _filter_counts["dropped_" + step] += counts[step]
+
+def detect_tiled(img, predict_many):
+    """Run predict_many over the tiles of img and merge their detections into img coordinates."""
+    return detect_tiled_many([img], predict_many)[0]
+
+def detect_tiled_many(images, predict_many):
+    """Detect over the tiles of several images with a single predict_many call."""
+    tiles = [tile_boxes(img.shape) for img in images]
+    crops = [img[y_min:y_max, x_min:x_max] for img, boxes in zip(images, tiles)
+             for x_min, y_min, x_max, y_max in boxes]
+    outputs = predict_many(crops)
+    detections, start = [], 0
+    for img, boxes in zip(images, tiles):
+        own = outputs[start:start + len(boxes)]
+        start += len(boxes)
+        detections.append(own[0] if len(boxes) == 1 else merge_tile_detections(own, boxes, img.shape, VISION_TILE_MERGE_IOU))
+    return detections
+
+def _finish(scaled, scale, detections, features):
+    kept, counts = filter_detections(detections, _confidence_floors, DETECTION_NMS_IOU, DETECTION_CONTAINMENT)
+    counts.update(boxes_in=len(detections), boxes_kept=len(kept))
+    return build_result_data(scaled, kept, features, scale), counts
+
+def analyze_with(img, predict_many, features):
+    """
+    Preprocess img to the pixel budget, detect over its tiles, filter the detections and build
+    result_data. Returns result_data and the filter's per-step drop counts.
+    """
+    scaled, scale = fit_pixel_budget(img)
+    return _finish(scaled, scale, detect_tiled(scaled, predict_many), features)
+
+def analyze_many_with(images, predict_many, features):
+    """
+    analyze_with for several images: every tile of every image goes to predict_many in one call,
+    then filtering and feature extraction run per image on IMAGE_BATCH_THREADS threads.
+    """
+    prepared = [fit_pixel_budget(img) for img in images]
+    detections = detect_tiled_many([scaled for scaled, _ in prepared], predict_many)
+    jobs = [(scaled, scale, dets, features) for (scaled, scale), dets in zip(prepared, detections)]
+    if len(jobs) <= 1:
+        return [_finish(*job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=min(IMAGE_BATCH_THREADS, len(jobs))) as executor:
+        return list(executor.map(lambda job: _finish(*job), jobs))
+
+def build_result_data(img, detections, features, scale=1.0):
+    """
+    Turn (N, 6) detections of one BGR image into result_data entries with the requested features.
+    Features are computed on img; bbox values are divided by scale back to original-image pixels.
+    """
+    result_data = []
+    crop_boxes = []
+    crop_classes = []
+    for x_min, y_min, x_max, y_max, confidence, cls in detections.tolist():
+        cls_id = int(cls)
+        class_name = class_names[cls_id]
+        crop_boxes.append((x_min, y_min, x_max, y_max))
+        crop_classes.append(class_name)
+        x_min, y_min, x_max, y_max = x_min / scale, y_min / scale, x_max / scale, y_max / scale
+        width = x_max - x_min
+        height = y_max - y_min
+        center_x = x_min + width / 2
+        center_y = y_min + height / 2
+        result_data.append({
+            "class_id": cls_id,
+            "class_name": class_name,
+            "confidence": confidence,
+            "bbox": {
+                "width": width,
+                "height": height,
+                "center_x": center_x,
+                "center_y": center_y
+            },
+        })
+    # Only the requested per-box features are computed, each over all boxes at once.
+    for entry, box_features in zip(result_data, extract_features(img, crop_boxes, features, crop_classes)):
+        entry.update(box_features)
+    return result_data
+
+def refresh_features(img, result_data, features):
+    """
+    Copy of another image's result_data with every requested feature recomputed on img, so only
+    its detections are reused. Boxes are mapped onto img at the same pixel budget as analyze_with.
+    """
+    scaled, scale = fit_pixel_budget(img)
+    fresh, boxes = [], []
+    for entry in result_data:
+        bbox = entry["bbox"]
+        x_min = bbox["center_x"] - bbox["width"] / 2
+        y_min = bbox["center_y"] - bbox["height"] / 2
+        boxes.append((x_min * scale, y_min * scale,
+                      (x_min + bbox["width"]) * scale, (y_min + bbox["height"]) * scale))
+        fresh.append({key: entry[key] for key in ("class_id", "class_name", "confidence", "bbox")})
+    class_names = [entry["class_name"] for entry in fresh]
+    for entry, box_features in zip(fresh, extract_features(scaled, boxes, features, class_names)):
+        entry.update(box_features)
+    return fresh
+
+_backend = None
+_backend_lock = threading.Lock()
+_ready = threading.Event()
+_status = {"state": "idle"}
+
+@lru_cache(maxsize=None)
+def model_version():
+    """
+    Hash of the served detector and its post-processing settings; retraining, switching
+    backends or changing the detection filter invalidates cached analyses.
+    """
+    return digest(detector_version(), _confidence_floors, str((DETECTION_NMS_IOU, DETECTION_CONTAINMENT)))
+
+def _build_backend():
+    if VISION_POOL_SIZE > 0:
+        pool = VisionPool()
+        register_metrics('vision_pool', pool.stats)
+
+        def analyze_many(images, features):
+            # Each worker runs its own detector, so images are spread across the workers.
+            if len(images) <= 1:
+                return [pool.analyze(img, features) for img in images]
+            with ThreadPoolExecutor(max_workers=min(pool.size, len(images))) as executor:
+                return list(executor.map(lambda img: pool.analyze(img, features), images))
+
+        return pool, analyze_many
+    # Concurrent requests share batched forward passes through the scheduler
+    scheduler = InferenceScheduler(yolo_batch_predictor(load_detector()))
+    register_metrics('yolo_scheduler', scheduler.stats)
+
+    def predict_many(images):
+        # Tiles of one page join the same micro-batch as other requests' images.
+        return [future.result() for future in [scheduler.submit(image) for image in images]]
+
+    return scheduler, lambda images, features: analyze_many_with(images, predict_many, features)
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _build_backend()
+    return _backend
+
+def analyze_image(img, features):
+    """Detect UI elements in a BGR image and return result_data, loading models on first use."""
+    return analyze_images([img], features)[0]
+
+def analyze_images(images, features):
+    """analyze_image for several BGR images, detected together; returns one result_data per image."""
+    results = []
+    for result_data, counts in _get_backend()[1](images, features):
+        _record_filter(counts)
+        results.append(result_data)
+    return results
+
+def warm_up():
+    """Load the models and push a dummy image through them so the first request is fast."""
+    _status.update(state="warming", started_at=time.time())
+    started = time.perf_counter()
+    try:
+        backend, analyze = _get_backend()
+        model_version()
+        dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+        if isinstance(backend, VisionPool):
+            backend.warm_up(dummy)
+        else:
+            analyze([dummy], ('colors',))
+            if 'text' in parse_features():
+                get_reader()
+    except Exception as e:
+        _status.update(state="failed", error=str(e))
+        raise
+    _status.update(
+        state="ready",
+        warmup_seconds=round(time.perf_counter() - started, 3),
+        max_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    )
+    _ready.set()
+
+def start_warmup():
+    """Warm models in a daemon thread, or mark the service ready at once when warm-up is disabled."""
+    if not VISION_WARMUP:
+        _status.update(state="lazy")
+        _ready.set()
+        return
+    threading.Thread(target=warm_up, name="vision-warmup", daemon=True).start()
+
+def vision_status():
+    return {"ready": _ready.is_set(), **_status}
@@ -0,0 +1,164 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+# Worker processes for detection + feature extraction; 0 keeps the work on the request thread.
+VISION_POOL_SIZE = int(os.getenv('VISION_POOL_SIZE', 0))
+VISION_POOL_TORCH_THREADS = int(os.getenv('VISION_POOL_TORCH_THREADS', 1))
+VISION_POOL_CV_THREADS = int(os.getenv('VISION_POOL_CV_THREADS', 1))
+VISION_POOL_MAX_QUEUE = int(os.getenv('VISION_POOL_MAX_QUEUE', 16))
+VISION_POOL_TIMEOUT = float(os.getenv('VISION_POOL_TIMEOUT', 30))
+
+class VisionPoolSaturated(Exception):
+    pass
+
+_worker_predict = None
+
+def _init_worker(torch_threads, cv_threads):
+    """Pin thread counts and load the detector (and OCR reader, if used) once per worker process."""
+    global _worker_predict
+    import cv2
+    import torch
+    from helpers.feature_helper import parse_features
+    from helpers.inference_helper import yolo_batch_predictor
+    from helpers.ocr_helper import get_reader
+    from helpers.vision_helper import load_detector
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(cv_threads)
+    _worker_predict = yolo_batch_predictor(load_detector())
+    if 'text' in parse_features():
+        get_reader()
+
+def _analyze_shared(shm_name, shape, features):
+    from helpers.vision_helper import analyze_with
+    shm = SharedMemory(name=shm_name)
+    try:
+        img = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        analysis = analyze_with(img, _worker_predict, features)
+        del img
+        return analysis
+    finally:
+        shm.close()
+
+class VisionPool:
+    """
+    Process pool running detection and feature extraction off the request thread.
+    Images are handed over through shared memory rather than pickled. Once max_queue images
+    are in flight, further work is rejected immediately with VisionPoolSaturated. When a worker
+    dies (out of memory, a native crash), the pool is replaced so later requests get fresh workers.
+    """
+
+    def __init__(self, size=None, torch_threads=None, cv_threads=None, max_queue=None, timeout=None):
+        self.size = size or VISION_POOL_SIZE
+        self.max_queue = max_queue or VISION_POOL_MAX_QUEUE
+        self.timeout = VISION_POOL_TIMEOUT if timeout is None else timeout
+        self._threads = (torch_threads or VISION_POOL_TORCH_THREADS, cv_threads or VISION_POOL_CV_THREADS)
+        self._executor = self._start()
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def _start(self):
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=get_context('spawn'),
+            initializer=_init_worker,
+            initargs=self._threads
+        )
+
+    def _restart(self, broken):
+        """Replace broken, unless another request already has."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._start()
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def analyze(self, img, features):
+        """Run analyze_with for img in a worker and wait up to timeout seconds."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise VisionPoolSaturated("Image analysis is at capacity, please retry shortly")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            shm = SharedMemory(create=True, size=max(img.nbytes, 1))
+        except Exception:
+            self._release(None)
+            raise
+        try:
+            np.ndarray(img.shape, dtype=np.uint8, buffer=shm.buf)[...] = img
+            executor = self._executor
+            try:
+                future = executor.submit(_analyze_shared, shm.name, img.shape, features)
+            except BrokenProcessPool:
+                # A worker died after the last task finished; nothing ran on the new pool yet.
+                self._restart(executor)
+                executor = self._executor
+                future = executor.submit(_analyze_shared, shm.name, img.shape, features)
+        except Exception:
+            self._release(shm)
+            raise
+        # The slot and the shared memory belong to the task until it really ends: a task that
+        # outlives the timeout keeps its worker busy and must keep counting towards max_queue.
+        future.add_done_callback(lambda _: self._release(shm))
+        try:
+            analysis = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise Exception("Image analysis timed out")
+        except BrokenProcessPool:
+            # Not retried: this image may be what brought the worker down.
+            self._restart(executor)
+            raise Exception("Image analysis worker crashed")
+        with self._lock:
+            self.completed += 1
+        return analysis
+
+    def _release(self, shm):
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def warm_up(self, img):
+        """Run img once per worker so every process has loaded and exercised the model."""
+        shm = SharedMemory(create=True, size=max(img.nbytes, 1))
+        try:
+            np.ndarray(img.shape, dtype=np.uint8, buffer=shm.buf)[...] = img
+            futures = [self._executor.submit(_analyze_shared, shm.name, img.shape, ('colors',))
+                       for _ in range(self.size)]
+            for future in futures:
+                future.result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.size,
+                "in_flight": self._in_flight,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -14,6 +14,12 @@ from mongoengine import (
 class EditorMessage(Document):
     prompt = StringField(required=True)
     response = StringField()
+    # pending/running while a generation job fills in response, then done or failed
+    status = StringField(default='done')
+    error = StringField()
+    # Set when response came from applying this patch to base_message's files instead of a full regeneration
+    patch = StringField()
+    base_message = ReferenceField('EditorMessage', null=True)
     created_at = DateTimeField(default=datetime.datetime.now(datetime.timezone.utc))
     
     meta = {"collection": "editor_messages"}
@@ -24,6 +30,8 @@ class EditorMessage(Document):
 class ChatMessage(Document):
     prompt = StringField(required=True)
     response = StringField()
+    status = StringField(default='done')
+    error = StringField()
     likes = IntField(default=0)
     dislikes = IntField(default=0)
     editor_message = ReferenceField('EditorMessage', reverse_delete_rule=CASCADE, null=True)
@@ -39,6 +47,11 @@ class Chat(Document):
     title = StringField(required=True)
     chat_messages = ListField(ReferenceField('ChatMessage', reverse_delete_rule=CASCADE))
     editor_messages = ListField(ReferenceField('EditorMessage', reverse_delete_rule=CASCADE))
+    # Rolling summaries of the oldest turns, and how many turns each covers (see context_helper)
+    summary = StringField()
+    summary_turns = IntField(default=0)
+    code_summary = StringField()
+    code_summary_turns = IntField(default=0)
     created_at = DateTimeField(default=datetime.datetime.now(datetime.timezone.utc))
     updated_at = DateTimeField(default=datetime.datetime.now(datetime.timezone.utc))
     
@@ -68,3 +81,64 @@ class User(Document):
     
     def __str__(self):
         return f"User({self.id}, {self.name})"
+
+class CacheEntry(Document):
+    namespace = StringField(required=True)
+    key = StringField(required=True)
+    value = StringField()
+    created_at = DateTimeField(default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    last_used = DateTimeField(default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    meta = {
+        "collection": "cache_entries",
+        "indexes": [
+            {"fields": ["namespace", "key"], "unique": True},
+            ("namespace", "last_used")
+        ]
+    }
+
+    def __str__(self):
+        return f"CacheEntry({self.namespace}, {self.key})"
+
+class GenerationJob(Document):
+    kind = StringField(required=True)
+    prompt = StringField(required=True)
+    message_type = StringField(required=True, choices=('chat', 'editor'))
+    message_id = StringField(required=True)
+    cache = BooleanField(default=False)
+    status = StringField(default='pending', choices=('pending', 'running', 'done', 'failed'))
+    attempts = IntField(default=0)
+    max_attempts = IntField(default=3)
+    error = StringField()
+    # A claimed job is invisible to other workers until this time; after it, the job is retried.
+    visible_at = DateTimeField(default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    created_at = DateTimeField(default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    updated_at = DateTimeField(default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    meta = {
+        "collection": "generation_jobs",
+        "indexes": [("status", "visible_at", "created_at")]
+    }
+
+    def __str__(self):
+        return f"GenerationJob({self.id}, {self.kind}, {self.status})"
+
+class GenerationLease(Document):
+    key = StringField(required=True)
+    owner = StringField(required=True)
+    status = StringField(default='running', choices=('running', 'done', 'failed'))
+    result = StringField()
+    error = StringField()
+    # Running leases past this time are abandoned; finished ones are removed by the TTL index.
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        "collection": "generation_leases",
+        "indexes": [
+            {"fields": ["key"], "unique": True},
+            {"fields": ["expires_at"], "expireAfterSeconds": 0}
+        ]
+    }
+
+    def __str__(self):
+        return f"GenerationLease({self.key}, {self.status})"
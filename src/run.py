@@ -1,9 +1,9 @@
 from app import create_app
 import os
 
-app = create_app()
-
+# Guarded: spawned vision pool workers re-import this module and must not build the app
 if __name__ == '__main__':
+    app = create_app()
     PORT = os.getenv("PORT", 5000)
     app.run(host='0.0.0.0', port=PORT, debug=True)
     app.logger.info(f"Server Running on port http://localhost:{PORT}")
\ No newline at end of file
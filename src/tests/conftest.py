@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other from src (e.g. "from helpers.x import ..."), as they do when the app runs.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
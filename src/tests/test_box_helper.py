@@ -0,0 +1,43 @@
+import numpy as np
+from helpers.box_helper import merge_tile_detections
+
+# A 1000x2000 page cut into two tiles that overlap on rows 1000-1500.
+SHAPE = (2000, 1000, 3)
+TILES = [(0, 0, 1000, 1500), (0, 1000, 1000, 2000)]
+
+def _detections(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+def _merge(top, bottom, iou_threshold=0.5):
+    merged = merge_tile_detections([top, bottom], TILES, SHAPE, iou_threshold)
+    return sorted(map(tuple, merged.astype(float).round(3).tolist()))
+
+def test_cut_piece_is_dropped_for_the_whole_copy_in_the_next_tile():
+    # Page rows 1400-1600: cut at the bottom of the first tile, whole in the second.
+    top = _detections([100, 1400, 300, 1500, 0.6, 1])
+    bottom = _detections([100, 400, 300, 600, 0.9, 1])
+    assert _merge(top, bottom) == [(100, 1400, 300, 1600, 0.9, 1)]
+
+def test_element_taller_than_the_overlap_is_joined_from_its_pieces():
+    # Page rows 800-1800 never fit in one tile: both tiles only see cut pieces.
+    top = _detections([50, 800, 950, 1500, 0.7, 2])
+    bottom = _detections([52, 0, 948, 800, 0.8, 2])
+    assert _merge(top, bottom) == [(50, 800, 950, 1800, 0.8, 2)]
+
+def test_pieces_that_do_not_line_up_stay_separate():
+    top = _detections([0, 1300, 200, 1500, 0.7, 2])
+    bottom = _detections([150, 0, 900, 300, 0.8, 2])
+    assert len(_merge(top, bottom)) == 2
+
+def test_same_class_duplicates_across_tiles_are_removed():
+    # Page rows 1100-1200 lie inside the overlap and are seen whole by both tiles.
+    top = _detections([200, 1100, 400, 1200, 0.8, 3], [600, 1100, 700, 1200, 0.9, 4])
+    bottom = _detections([202, 101, 401, 199, 0.9, 3], [600, 100, 700, 200, 0.7, 5])
+    merged = _merge(top, bottom)
+    assert [row for row in merged if row[5] == 3] == [(202, 1101, 401, 1199, 0.9, 3)]
+    # Different classes at the same place are different elements.
+    assert {row[5] for row in merged} == {3, 4, 5}
+
+def test_no_detections():
+    empty = np.zeros((0, 6), dtype=np.float32)
+    assert merge_tile_detections([empty, empty], TILES, SHAPE, 0.5).shape == (0, 6)
@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+import pytest
+from helpers.color_helper import dominant_colors, dominant_colors_batch, kmeans_color_error
+
+# Largest RGB distance allowed between a full-pixel KMeans center and the nearest fast color.
+MAX_COLOR_ERROR = 12.0
+
+def _button():
+    crop = np.full((48, 160, 3), (235, 99, 37), np.uint8)  # BGR blue
+    cv2.putText(crop, "Sign up", (30, 32), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+    return crop
+
+def _card():
+    crop = np.full((220, 300, 3), (250, 250, 250), np.uint8)
+    crop[:60] = (64, 64, 64)
+    cv2.rectangle(crop, (20, 160), (140, 200), (80, 175, 76), -1)
+    cv2.putText(crop, "Pricing", (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (30, 30, 30), 2, cv2.LINE_AA)
+    return crop
+
+def _navbar():
+    crop = np.full((64, 900, 3), (40, 24, 17), np.uint8)
+    for i, label in enumerate(("Home", "Features", "Docs", "Blog")):
+        cv2.putText(crop, label, (40 + i * 150, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (220, 220, 220), 1, cv2.LINE_AA)
+    cv2.rectangle(crop, (760, 14), (880, 50), (0, 140, 255), -1)
+    return crop
+
+@pytest.mark.parametrize("make_crop", [_button, _card, _navbar])
+def test_dominant_colors_match_kmeans(make_crop):
+    pytest.importorskip("sklearn")
+    max_err, mean_err = kmeans_color_error(make_crop(), num_colors=3)
+    assert max_err < MAX_COLOR_ERROR
+    assert mean_err <= max_err
+
+def test_solid_crop_is_exact():
+    crop = np.full((40, 40, 3), (10, 20, 30), np.uint8)
+    assert dominant_colors(crop, num_colors=2)[0] == [30, 20, 10]
+
+def test_batch_matches_single_crops_and_handles_empty_boxes():
+    image = np.zeros((220, 900, 3), np.uint8)
+    image[:48, :160] = _button()
+    image[:, 300:600] = _card()
+    boxes = [(0, 0, 160, 48), (300, 0, 600, 220), (10, 10, 10, 10)]
+    batch = dominant_colors_batch(image, boxes, num_colors=3)
+    assert batch[0] == dominant_colors(image[:48, :160], num_colors=3)
+    assert batch[1] == dominant_colors(image[:, 300:600], num_colors=3)
+    assert batch[2] == []
@@ -0,0 +1,56 @@
+import threading
+import mongoengine
+import mongomock
+import pytest
+import helpers.context_helper as context_helper
+from helpers.context_helper import build_context
+from infra.db.models import Chat, ChatMessage
+
+@pytest.fixture
+def chat():
+    mongoengine.connect('context_test', mongo_client_class=mongomock.MongoClient)
+    chat = Chat(title='t')
+    chat.save()
+    yield chat
+    mongoengine.disconnect()
+
+def _add_turns(chat, first, count):
+    for i in range(first, first + count):
+        message = ChatMessage(prompt=f"p{i}", response=f"r{i}")
+        message.save()
+        chat.update(push__chat_messages=message)
+
+def _wait_for_folds():
+    context_helper._fold_pool.submit(lambda: None).result()
+    while context_helper._folding:
+        context_helper._fold_pool.submit(lambda: None).result()
+
+def test_summary_is_folded_in_the_background(chat, monkeypatch):
+    release = threading.Event()
+    prompts = []
+
+    def generate(prompt, kind='text', cache=False):
+        prompts.append(prompt)
+        release.wait(5)
+        return "summary of p0-p3"
+
+    monkeypatch.setattr(context_helper, 'generate', generate)
+    recent, batch = context_helper.CONTEXT_RECENT_TURNS, context_helper.CONTEXT_SUMMARY_BATCH
+    _add_turns(chat, 0, recent + batch)
+    # The summary model is blocked, yet the context comes back with every turn verbatim.
+    context = build_context(chat)
+    assert "Summary" not in context
+    assert context.startswith("User: p0\n") and f"User: p{recent + batch - 1}\n" in context
+    release.set()
+    _wait_for_folds()
+    assert len(prompts) == 1
+    stored = Chat.objects(id=chat.id).first()
+    assert (stored.summary, stored.summary_turns) == ("summary of p0-p3", batch)
+    context = build_context(chat)
+    assert context.startswith("Summary of the earlier conversation:\nsummary of p0-p3\n")
+    assert "User: p0\n" not in context and f"User: p{batch}\n" in context
+
+def test_history_is_trimmed_to_the_budget_newest_first(chat, monkeypatch):
+    monkeypatch.setattr(context_helper, 'CONTEXT_TOKEN_BUDGET', 15)
+    _add_turns(chat, 0, 3)
+    assert build_context(chat) == "User: p1\nBot: r1\nUser: p2\nBot: r2\n"
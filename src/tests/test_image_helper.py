@@ -0,0 +1,15 @@
+from helpers.image_helper import tile_boxes
+
+def test_landscape_screenshots_are_a_single_tile():
+    for height, width in ((1080, 1920), (900, 1440), (768, 1366), (1080, 1080)):
+        assert tile_boxes((height, width, 3)) == [(0, 0, width, height)]
+
+def test_wide_images_are_not_split_across():
+    assert tile_boxes((500, 4000, 3)) == [(0, 0, 4000, 500)]
+
+def test_long_page_is_tiled_vertically_at_full_width():
+    tiles = tile_boxes((5000, 1000, 3), aspect=2.0, overlap=0.2)
+    assert tiles == [(0, 0, 1000, 2000), (0, 1600, 1000, 3600), (0, 3000, 1000, 5000)]
+
+def test_page_just_under_the_threshold_is_one_tile():
+    assert tile_boxes((1999, 1000, 3), aspect=2.0) == [(0, 0, 1000, 1999)]
@@ -0,0 +1,20 @@
+import json
+from helpers.llm_provider_helper import FakeModel
+from helpers.patch_helper import PATCH_INSTRUCTIONS, apply_patch
+
+CODE_CONFIG = {"response_mime_type": "application/json"}
+
+def _reply(prompt):
+    return FakeModel('fake-code', CODE_CONFIG)._text(prompt)
+
+def test_code_replies_are_file_maps():
+    files = json.loads(_reply("User: make a landing page\nBot: "))
+    assert set(files) == {"/App.js", "/styles.css"}
+    assert _reply("User: make a landing page\nBot: ") == json.dumps(files)
+
+def test_patch_prompts_get_a_patch_that_applies():
+    for files in ({"/App.js": "app", "/styles.css": "css"}, {"/App.js": {"code": "app"}}):
+        prompt = f"{PATCH_INSTRUCTIONS}Current files:\n{json.dumps(files)}\n\nUser: add a footer\nBot: "
+        patch = json.loads(_reply(prompt))
+        patched = apply_patch(files, patch)
+        assert patched != files and set(patched) == set(files)
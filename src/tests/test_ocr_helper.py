@@ -0,0 +1,47 @@
+import time
+import numpy as np
+import pytest
+from helpers import ocr_helper
+
+class SlowReader:
+    """Fake easyocr.Reader that spends seconds on each crop, like the CPU reader."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.crops = 0
+
+    def recognize(self, gray, horizontal_list, free_list, batch_size, detail):
+        results = []
+        for x_min, x_max, y_min, y_max in horizontal_list:
+            time.sleep(self.seconds)
+            self.crops += 1
+            points = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+            results.append((points, f"text {x_min}", 0.9))
+        return results
+
+@pytest.fixture
+def reader(monkeypatch):
+    reader = SlowReader(0.02)
+    monkeypatch.setattr(ocr_helper, 'get_reader', lambda: reader)
+    monkeypatch.setattr(ocr_helper, '_cache', ocr_helper.LRUCache(1024))
+    return reader
+
+def _image_and_boxes(count):
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 255, (20, count * 10), dtype=np.uint8)
+    return gray, [(i * 10, 0, i * 10 + 8, 20) for i in range(count)]
+
+def test_all_boxes_are_read_within_the_budget(reader):
+    gray, boxes = _image_and_boxes(6)
+    assert ocr_helper.recognize_text(gray, boxes, budget_ms=10000) == [f"text {i * 10}" for i in range(6)]
+
+def test_budget_stops_recognition_partway_through_what_used_to_be_one_batch(reader):
+    gray, boxes = _image_and_boxes(32)
+    started = time.monotonic()
+    texts = ocr_helper.recognize_text(gray, boxes, budget_ms=50)
+    elapsed = time.monotonic() - started
+    # 50ms of 20ms crops: the budget runs out in the first small batch and at most one more starts.
+    assert reader.crops <= 2 * ocr_helper.OCR_BATCH_SIZE < len(boxes)
+    assert texts[:reader.crops] == [f"text {i * 10}" for i in range(reader.crops)]
+    assert texts[reader.crops:] == [None] * (len(boxes) - reader.crops)
+    assert elapsed < 32 * reader.seconds / 2
@@ -0,0 +1,106 @@
+import json
+import mongoengine
+import mongomock
+import pytest
+from helpers.patch_helper import PatchError, apply_patch, latest_snapshot
+from infra.db.models import Chat, EditorMessage
+
+FILES = {
+    "/App.js": "export default function App() {\n  return <h1>Hi</h1>;\n}\n",
+    "/styles.css": "h1 { color: red; }\n",
+}
+
+def _apply(*edits, files=FILES):
+    return apply_patch(files, {"edits": list(edits)})
+
+def test_replace():
+    files = _apply({"op": "replace", "path": "/App.js", "find": "<h1>Hi</h1>", "content": "<h1>Hello</h1>"})
+    assert files["/App.js"] == "export default function App() {\n  return <h1>Hello</h1>;\n}\n"
+    assert files["/styles.css"] == FILES["/styles.css"]
+    assert FILES["/App.js"].count("<h1>Hi</h1>") == 1
+
+def test_insert_after_anchor_and_append():
+    files = _apply(
+        {"op": "insert", "path": "/styles.css", "after": "color: red;", "content": " margin: 0;"},
+        {"op": "insert", "path": "/styles.css", "content": "p { color: gray; }\n"},
+    )
+    assert files["/styles.css"] == "h1 { color: red; margin: 0; }\np { color: gray; }\n"
+
+def test_insert_without_anchor_creates_a_missing_file():
+    assert _apply({"op": "insert", "path": "/new.js", "content": "x"})["/new.js"] == "x"
+
+def test_delete_text_and_file():
+    files = _apply(
+        {"op": "delete", "path": "/App.js", "find": "  return <h1>Hi</h1>;\n"},
+        {"op": "delete", "path": "/styles.css"},
+    )
+    assert files == {"/App.js": "export default function App() {\n}\n"}
+
+def test_write_creates_and_overwrites():
+    files = _apply(
+        {"op": "write", "path": "/styles.css", "content": ""},
+        {"op": "write", "path": "/Nav.js", "content": "nav"},
+    )
+    assert files["/styles.css"] == "" and files["/Nav.js"] == "nav"
+
+def test_edits_apply_in_order():
+    files = _apply(
+        {"op": "write", "path": "/Nav.js", "content": "a"},
+        {"op": "replace", "path": "/Nav.js", "find": "a", "content": "b"},
+    )
+    assert files["/Nav.js"] == "b"
+
+def test_code_objects_are_kept_for_edited_and_new_files():
+    wrapped = {path: {"code": code, "hidden": False} for path, code in FILES.items()}
+    files = _apply(
+        {"op": "replace", "path": "/App.js", "find": "Hi", "content": "Hey"},
+        {"op": "write", "path": "/Nav.js", "content": "nav"},
+        files=wrapped,
+    )
+    assert files["/App.js"] == {"code": FILES["/App.js"].replace("Hi", "Hey"), "hidden": False}
+    assert files["/Nav.js"] == {"code": "nav"}
+
+@pytest.mark.parametrize("patch, message", [
+    ({}, "no edits"),
+    ({"edits": []}, "no edits"),
+    ({"edits": [{"op": "write", "content": "x"}]}, "Invalid edit"),
+    ({"edits": [{"op": "rename", "path": "/App.js"}]}, "Unknown edit op"),
+    ({"edits": [{"op": "replace", "path": "/App.js", "find": "<h1>Hi</h1>"}]}, "needs text content"),
+    ({"edits": [{"op": "write", "path": "/App.js", "content": 3}]}, "needs text content"),
+    ({"edits": [{"op": "insert", "path": "/App.js", "after": "{"}]}, "needs text content"),
+    ({"edits": [{"op": "replace", "path": "/App.js", "find": "nope", "content": "x"}]}, "matches 0 times"),
+    ({"edits": [{"op": "replace", "path": "/App.js", "find": "\n", "content": "x"}]}, "matches 3 times"),
+    ({"edits": [{"op": "replace", "path": "/App.js", "find": "", "content": "x"}]}, "non-empty"),
+    ({"edits": [{"op": "replace", "path": "/Missing.js", "find": "a", "content": "b"}]}, "does not exist"),
+    ({"edits": [{"op": "insert", "path": "/App.js", "after": "nope", "content": "x"}]}, "matches 0 times"),
+    ({"edits": [{"op": "delete", "path": "/Missing.js"}]}, "does not exist"),
+    ({"edits": [{"op": "delete", "path": "/App.js", "find": "nope"}]}, "matches 0 times"),
+])
+def test_invalid_patches_raise(patch, message):
+    with pytest.raises(PatchError, match=message):
+        apply_patch(FILES, patch)
+
+def test_failed_patch_leaves_files_untouched():
+    files = dict(FILES)
+    with pytest.raises(PatchError):
+        apply_patch(files, {"edits": [
+            {"op": "write", "path": "/App.js", "content": ""},
+            {"op": "delete", "path": "/Missing.js"},
+        ]})
+    assert files == FILES
+
+def test_latest_snapshot_skips_unfinished_and_non_map_messages():
+    mongoengine.connect('patch_test', mongo_client_class=mongomock.MongoClient)
+    try:
+        done = EditorMessage(prompt="a", response=json.dumps(FILES))
+        not_json = EditorMessage(prompt="b", response="not json")
+        pending = EditorMessage(prompt="c", status='pending')
+        for message in (done, not_json, pending):
+            message.save()
+        chat = Chat(title="t", editor_messages=[done, not_json, pending])
+        chat.save()
+        message, files = latest_snapshot(chat)
+        assert message.id == done.id and files == FILES
+        assert latest_snapshot(Chat(title="empty").save()) == (None, None)
+    finally:
+        mongoengine.disconnect()
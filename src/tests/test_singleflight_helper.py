@@ -0,0 +1,41 @@
+import datetime
+import mongoengine
+import mongomock
+import pytest
+import helpers.singleflight_helper as singleflight_helper
+from helpers.singleflight_helper import single_flight
+from infra.db.models import GenerationLease
+
+@pytest.fixture(autouse=True)
+def db():
+    mongoengine.connect('singleflight_test', mongo_client_class=mongomock.MongoClient)
+    GenerationLease.drop_collection()
+    GenerationLease.ensure_indexes()
+    # Leave expired leases in place, as they are until MongoDB's TTL monitor gets to them.
+    GenerationLease._get_collection().drop_index('expires_at_1')
+    yield
+    mongoengine.disconnect()
+
+def _lease(key, status, seconds, result=None):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    GenerationLease(key=key, owner='other-process', status=status, result=result,
+                    expires_at=now + datetime.timedelta(seconds=seconds)).save()
+
+def test_joins_a_finished_lease_while_it_lingers():
+    _lease('k', 'done', 5, result='{"message_id": "first"}')
+    assert single_flight('k', lambda: {"message_id": "second"}) == {"message_id": "first"}
+
+def test_runs_again_once_a_finished_lease_has_expired():
+    _lease('k', 'done', -1, result='{"message_id": "first"}')
+    assert single_flight('k', lambda: {"message_id": "second"}) == {"message_id": "second"}
+    assert GenerationLease.objects(key='k').first().owner == singleflight_helper._OWNER
+
+def test_failed_lease_that_expired_is_retried():
+    _lease('k', 'failed', -1)
+    assert single_flight('k', lambda: 1) == 1
+
+def test_takes_over_an_abandoned_running_lease():
+    before = singleflight_helper._stats()["takeovers"]
+    _lease('k', 'running', -1)
+    assert single_flight('k', lambda: 2) == 2
+    assert singleflight_helper._stats()["takeovers"] == before + 1
@@ -0,0 +1,20 @@
+import numpy as np
+from helpers.vision_helper import refresh_features
+
+def test_refresh_features_keeps_boxes_and_recomputes_colors():
+    # Analysis of a page with a blue button, reused for a near-duplicate with a red one.
+    reused = [{
+        "class_id": 0,
+        "class_name": "button",
+        "confidence": 0.9,
+        "bbox": {"width": 40, "height": 20, "center_x": 30, "center_y": 20},
+        "color_distribution": [[0, 0, 255]],
+        "text": "someone else's text",
+    }]
+    img = np.full((100, 100, 3), 255, np.uint8)
+    img[10:30, 10:50] = (0, 0, 255)  # BGR red
+    fresh = refresh_features(img, reused, ('colors',))
+    assert fresh[0]["bbox"] == reused[0]["bbox"]
+    assert fresh[0]["color_distribution"][0] == [255, 0, 0]
+    assert "text" not in fresh[0]
+    assert reused[0]["color_distribution"] == [[0, 0, 255]]
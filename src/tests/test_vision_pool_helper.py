@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+import pytest
+import helpers.vision_pool_helper as vision_pool_helper
+from helpers.vision_pool_helper import VisionPool, VisionPoolSaturated
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A VisionPool whose tasks run on threads and block until release is set."""
+    release = threading.Event()
+
+    def analyze_shared(shm_name, shape, features):
+        release.wait(5)
+        return {"elements": []}
+
+    monkeypatch.setattr(vision_pool_helper, '_analyze_shared', analyze_shared)
+    pool = VisionPool(size=1, max_queue=1, timeout=0.05)
+    pool._executor.shutdown()
+    pool._executor = ThreadPoolExecutor(max_workers=1)
+    yield pool, release
+    release.set()
+    pool._executor.shutdown(wait=True)
+
+def test_timed_out_task_keeps_its_slot_until_it_finishes(pool):
+    pool, release = pool
+    img = np.zeros((4, 4, 3), np.uint8)
+    with pytest.raises(Exception, match="timed out"):
+        pool.analyze(img, ())
+    # The timed-out task is still running, so the pool is still saturated.
+    assert pool.stats()["in_flight"] == 1
+    with pytest.raises(VisionPoolSaturated):
+        pool.analyze(img, ())
+    release.set()
+    pool._executor.submit(lambda: None).result()
+    assert pool.stats()["in_flight"] == 0
+    assert pool.analyze(img, ()) == {"elements": []}
+
+def _crash(shm_name, shape, features):
+    os._exit(1)
+
+def _empty(shm_name, shape, features):
+    return {"elements": []}
+
+def test_crashed_worker_is_replaced_for_later_requests(monkeypatch):
+    monkeypatch.setattr(VisionPool, '_start', lambda self: ProcessPoolExecutor(1, mp_context=get_context('fork')))
+    pool = VisionPool(size=1, max_queue=2, timeout=10)
+    img = np.zeros((4, 4, 3), np.uint8)
+    try:
+        monkeypatch.setattr(vision_pool_helper, '_analyze_shared', _crash)
+        with pytest.raises(Exception, match="crashed"):
+            pool.analyze(img, ())
+        monkeypatch.setattr(vision_pool_helper, '_analyze_shared', _empty)
+        assert pool.analyze(img, ()) == {"elements": []}
+        assert pool.stats()["restarts"] == 1
+        # Slots are released by a done callback, which may run just after result() returns.
+        deadline = time.monotonic() + 5
+        while pool.stats()["in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.stats()["in_flight"] == 0
+    finally:
+        pool.shutdown()